@@ -1,14 +1,23 @@
-from flask import Flask, send_from_directory
 import os
+
+# Forcer CPU avant tout import de modèles
+os.environ['CUDA_VISIBLE_DEVICES'] = ''
+
+from flask import Flask, send_from_directory
 from app.routes.document_db_routes import document_db_bp
 from app.routes.document_routes import document_bp
 from app.routes.rag_routes import qa_bp
 from app.routes.user_routes import user_bp
 from app.routes.chat_history_routes import chat_history_bp
+from app.routes.system_routes import system_bp
 from .extentions import db, ma, cors, jwt
 from flask_jwt_extended import JWTManager
 from .config import Config
-import torch
+from .utils.schema_upgrade import add_missing_columns
+from .services.startup_service import initialize_startup_mode
+from .services.maintenance_service import start_maintenance_scheduler
+from .services.ingestion_job_service import fail_interrupted_jobs
+from .services.document_service import backfill_content_hashes
 
 jwt = JWTManager()
 
@@ -27,6 +36,7 @@ def create_app():
     app.register_blueprint(document_bp, url_prefix="/api")
     app.register_blueprint(user_bp, url_prefix='/api')
     app.register_blueprint(chat_history_bp, url_prefix='/api')
+    app.register_blueprint(system_bp, url_prefix='/api')
 
     @app.route('/', defaults={'path': ''})
     @app.route('/<path:path>')
@@ -36,10 +46,13 @@ def create_app():
         else:
             return send_from_directory(app.static_folder, 'index.html')
 
-    # Forcer CPU avant tout import de modèles
-    os.environ['CUDA_VISIBLE_DEVICES'] = ''
-    torch.set_default_device('cpu')
-
     with app.app_context():
         db.create_all()
+        add_missing_columns(db)
+        backfill_content_hashes()
+        fail_interrupted_jobs()
+
+    # Load heavy models now, before fork, or on first use depending on STARTUP_MODE
+    initialize_startup_mode()
+    start_maintenance_scheduler(app)
     return app
@@ -0,0 +1,230 @@
+"""
+Async serving mode:
+
+    uvicorn app.asgi:app --host 0.0.0.0 --port 5000 --loop uvloop --workers 2
+
+/api/ask, /api/ask/stream and the ingestion status endpoint are served natively on the
+event loop: Gemini calls are awaited, retrieval (query embedding, index and database reads)
+runs on a bounded thread pool and chat history is written in the background, so an in-flight
+answer no longer holds a worker. Every other route is the unchanged Flask app, run on
+uvicorn's WSGI thread pool.
+"""
+import asyncio
+import json
+import re
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from flask_jwt_extended import decode_token
+from uvicorn.middleware.wsgi import WSGIMiddleware
+from . import create_app
+from .config import Config
+from .extentions import db
+from .models.chat_history import ChatHistory
+from .services.rag_service import agenerate_rag_response, astream_rag_response, parse_rerank_options
+from .services.ingestion_job_service import get_ingestion_job, serialize_ingestion_job
+
+flask_app = create_app()
+wsgi_app = WSGIMiddleware(flask_app, workers=Config.ASGI_WSGI_THREADS)
+
+# Blocking work of the async routes (embedding, Chroma, SQLite)
+_executor = ThreadPoolExecutor(max_workers=Config.ASGI_SYNC_THREADS, thread_name_prefix="asgi-sync")
+# Keep references to fire-and-forget tasks until they finish
+_background_tasks = set()
+
+
+async def run_sync(fn, *args, **kwargs):
+    """
+    Run a blocking function on the thread pool inside a Flask app context.
+    """
+    def call():
+        with flask_app.app_context():
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                db.session.remove()
+
+    return await asyncio.get_running_loop().run_in_executor(_executor, call)
+
+
+def _save_chat_history(user_email, question, answer, sources):
+    chat_entry = ChatHistory(user_email=user_email, question=question, answer=answer, sources=sources)
+    db.session.add(chat_entry)
+    db.session.commit()
+
+
+def _save_chat_history_in_background(*args):
+    task = asyncio.ensure_future(run_sync(_save_chat_history, *args))
+    _background_tasks.add(task)
+
+    def done(finished):
+        _background_tasks.discard(finished)
+        if not finished.cancelled() and finished.exception():
+            print(f"WARNING: could not save chat history: {finished.exception()}")
+
+    task.add_done_callback(done)
+
+
+# ---------------------------------------------------------------- HTTP helpers
+
+def _headers(scope):
+    return {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+
+
+def _cors_headers(scope):
+    # Same policy as flask-cors in create_app (any origin, credentials allowed)
+    origin = _headers(scope).get("origin")
+    if not origin:
+        return []
+    return [(b"access-control-allow-origin", origin.encode("latin-1")), (b"access-control-allow-credentials", b"true")]
+
+
+async def _read_json(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+    try:
+        return json.loads(body) if body else None
+    except ValueError:
+        return None
+
+
+async def _send_json(send, scope, data, status=200):
+    body = json.dumps(data, default=str).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())] + _cors_headers(scope)
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def _current_user(scope):
+    """
+    Identity of the request's JWT (same tokens as the Flask routes), or None.
+    """
+    authorization = _headers(scope).get("authorization", "")
+    if not authorization.startswith("Bearer "):
+        return None
+    try:
+        with flask_app.app_context():
+            return decode_token(authorization[len("Bearer "):])[flask_app.config.get("JWT_IDENTITY_CLAIM", "sub")]
+    except Exception:
+        return None
+
+
+def _sse(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n".encode("utf-8")
+
+
+# ---------------------------------------------------------------- routes
+
+async def ask(scope, receive, send, current_user):
+    data = await _read_json(receive)
+    if not data or 'query' not in data:
+        return await _send_json(send, scope, {"error": "Missing 'query' in request body"}, 400)
+
+    try:
+        rerank, rerank_candidates = parse_rerank_options(data)
+    except ValueError as e:
+        return await _send_json(send, scope, {"error": str(e)}, 400)
+
+    query = data['query']
+    try:
+        response = await agenerate_rag_response(
+            query,
+            user_email=str(current_user),
+            run_sync=run_sync,
+            rerank=rerank,
+            rerank_candidates=rerank_candidates
+        )
+    except Exception as e:
+        print(traceback.format_exc())
+        return await _send_json(send, scope, {"error": str(e)}, 500)
+
+    _save_chat_history_in_background(current_user, query, response["answer"], response.get("ranked_documents", []))
+    await _send_json(send, scope, {"user": current_user, "response": response})
+
+
+async def ask_stream(scope, receive, send, current_user):
+    data = await _read_json(receive)
+    if not data or 'query' not in data:
+        return await _send_json(send, scope, {"error": "Missing 'query' in request body"}, 400)
+
+    try:
+        rerank, rerank_candidates = parse_rerank_options(data)
+    except ValueError as e:
+        return await _send_json(send, scope, {"error": str(e)}, 400)
+
+    query = data['query']
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"text/event-stream"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no")
+        ] + _cors_headers(scope)
+    })
+
+    sources = []
+    try:
+        async for event, payload in astream_rag_response(
+            query,
+            user_email=str(current_user),
+            run_sync=run_sync,
+            rerank=rerank,
+            rerank_candidates=rerank_candidates
+        ):
+            if event == "sources":
+                sources = payload["ranked_documents"]
+            elif event == "done":
+                _save_chat_history_in_background(current_user, query, payload["answer"], sources)
+            await send({"type": "http.response.body", "body": _sse(event, payload), "more_body": True})
+    except Exception as e:
+        await send({"type": "http.response.body", "body": _sse("error", {"error": str(e)}), "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def processing_status(scope, receive, send, current_user, job_id):
+    def load():
+        job = get_ingestion_job(job_id, user_email=current_user)
+        return serialize_ingestion_job(job) if job else None
+
+    job = await run_sync(load)
+    if job is None:
+        return await _send_json(send, scope, {"error": "Job not found"}, 404)
+    await _send_json(send, scope, job)
+
+
+ROUTES = [
+    ("POST", re.compile(r"^/api/ask$"), ask),
+    ("POST", re.compile(r"^/api/ask/stream$"), ask_stream),
+    ("GET", re.compile(r"^/api/process-document/(?P<job_id>[^/]+)$"), processing_status),
+]
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                _executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    if scope["type"] == "http":
+        for method, pattern, handler in ROUTES:
+            match = pattern.match(scope["path"])
+            if match and scope["method"] == method:
+                current_user = _current_user(scope)
+                if current_user is None:
+                    return await _send_json(send, scope, {"msg": "Missing or invalid Authorization Header"}, 401)
+                return await handler(scope, receive, send, current_user, **match.groupdict())
+
+    # Everything else (uploads, documents, users, static frontend) stays on Flask
+    await wsgi_app(scope, receive, send)
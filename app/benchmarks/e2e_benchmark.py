@@ -0,0 +1,327 @@
+"""
+End-to-end benchmark of ingestion and question answering, offline.
+
+    python -m app.benchmarks.e2e_benchmark --docs 30 --concurrency 4 --queries 200 --clients 16
+
+Gemini is replaced by deterministic stubs with configurable latency (see fake_llm), and
+every store (database, vectors, BM25 index, caches) lives in a temporary directory, so it
+runs on a CPU-only box without network or quota. The embedding model must already be in
+the local Hugging Face cache.
+
+Phases:
+  pipeline  process_document_pipeline on a synthetic PDF/DOCX/TXT corpus, N files at a time
+  upload    POST /api/process-document, then poll GET /api/process-document/<job_id>
+  ask       concurrent POST /api/ask, and POST /api/ask/stream for time to first token
+
+Each phase reports throughput, p50/p95/p99 latency and peak RSS; the pipeline phase also
+reports the mean time spent in each stage (hash, extract, parse, chunk, embed, upsert).
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+USER = "bench@example.com"
+
+
+def _percentiles(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))] * 1000, 1)
+
+    return {"p50_ms": pick(50), "p95_ms": pick(95), "p99_ms": pick(99), "max_ms": round(ordered[-1] * 1000, 1)}
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in KiB on Linux; children covers the PDF extraction pool
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {"peak_rss_mb": round(own / 1024, 1), "peak_children_rss_mb": round(children / 1024, 1)}
+
+
+def _configure(workdir: str, args):
+    """
+    Point every store at the work directory before the app is created.
+    """
+    os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret")
+
+    from ..config import Config
+
+    Config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(workdir, 'benchmark.db')}"
+    Config.INGEST_UPLOAD_DIR = os.path.join(workdir, "uploads")
+    Config.SPARSE_INDEX_DIR = os.path.join(workdir, "sparse_index")
+    Config.NUMPY_VECTOR_DIR = os.path.join(workdir, "numpy_vectors")
+    Config.PARSE_CACHE_PATH = os.path.join(workdir, "cache", "parse_cache.db")
+    Config.EMBEDDING_CACHE_PATH = os.path.join(workdir, "cache", "embedding_cache.db")
+    Config.LLM_RATE_LIMIT_PATH = os.path.join(workdir, "cache", "rate_limit.db")
+    Config.MAINTENANCE_LOCK_DIR = workdir
+    Config.MAINTENANCE_INTERVAL_SECONDS = 0
+    Config.STARTUP_MODE = "lazy"
+
+    # Cold caches by default so repeated runs measure the same work
+    Config.PARSE_CACHE_ENABLED = args.caches
+    Config.EMBEDDING_CACHE_ENABLED = args.caches
+    Config.ANSWER_CACHE_ENABLED = args.caches
+    Config.LLM_RATE_LIMIT_PER_MINUTE = args.rate_limit
+    if args.pipeline_mode:
+        Config.INGEST_PIPELINE_MODE = args.pipeline_mode
+    if args.vector_backend:
+        Config.VECTOR_BACKEND = args.vector_backend
+
+    if Config.VECTOR_BACKEND == "chroma":
+        import chromadb
+        from ..services import vectorstore_service
+        vectorstore_service.chroma_client = chromadb.PersistentClient(path=os.path.join(workdir, "chroma"))
+
+
+def _create_app():
+    from .. import create_app
+    from ..extentions import db
+    from ..models.user import User
+    from ..services.embedding_service import embed_query
+
+    app = create_app()
+    with app.app_context():
+        db.session.add(User(
+            email=USER, prenom="Bench", nom="Mark", password="not-used",
+            numeroTel=0, dateNaissance=date(2000, 1, 1)
+        ))
+        db.session.commit()
+        # Load and warm the embedding model outside of the measured phases
+        embed_query("warmup")
+    return app
+
+
+def run_pipeline_phase(app, paths, concurrency: int, parser_mode: str = None):
+    from ..extentions import db
+    from ..services.treatment_pipeline_service import process_document_pipeline
+
+    def ingest(path):
+        start = time.perf_counter()
+        marks = [("hash", start)]
+        with app.app_context():
+            try:
+                process_document_pipeline(
+                    path,
+                    user_email=USER,
+                    on_stage=lambda stage, progress: marks.append((stage, time.perf_counter())),
+                    parser_mode=parser_mode
+                )
+            finally:
+                db.session.remove()
+        end = time.perf_counter()
+
+        stages = defaultdict(float)
+        for (stage, t0), (_, t1) in zip(marks, marks[1:] + [("end", end)]):
+            stages[stage] += t1 - t0
+        return end - start, stages
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(ingest, paths))
+    wall = time.perf_counter() - start
+
+    stage_totals = defaultdict(float)
+    for _, stages in results:
+        for stage, seconds in stages.items():
+            stage_totals[stage] += seconds
+
+    return {
+        "docs": len(paths),
+        "concurrency": concurrency,
+        "wall_s": round(wall, 2),
+        "docs_per_sec": round(len(paths) / wall, 3),
+        **_percentiles([latency for latency, _ in results]),
+        "mean_stage_ms": {stage: round(total / len(paths) * 1000, 1) for stage, total in stage_totals.items()},
+        **_peak_rss_mb()
+    }
+
+
+def _auth_headers(app):
+    from flask_jwt_extended import create_access_token
+
+    with app.app_context():
+        return {"Authorization": f"Bearer {create_access_token(identity=USER)}"}
+
+
+def run_upload_phase(app, paths, concurrency: int, poll_interval: float = 0.1):
+    headers = _auth_headers(app)
+    failures = []
+
+    def upload(path):
+        client = app.test_client()
+        start = time.perf_counter()
+        with open(path, "rb") as f:
+            response = client.post(
+                "/api/process-document",
+                data={"files": (f, os.path.basename(path))},
+                headers=headers,
+                content_type="multipart/form-data"
+            )
+        job_id = response.get_json()["job"]["job_id"]
+        accepted = time.perf_counter() - start
+
+        while True:
+            job = client.get(f"/api/process-document/{job_id}", headers=headers).get_json()
+            if job["status"] in ("done", "failed"):
+                break
+            time.sleep(poll_interval)
+        failures.extend(f["error"] for f in job["files"] if f["status"] == "failed")
+        return accepted, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(upload, paths))
+    wall = time.perf_counter() - start
+
+    return {
+        "docs": len(paths),
+        "concurrency": concurrency,
+        "wall_s": round(wall, 2),
+        "docs_per_sec": round(len(paths) / wall, 3),
+        "accept": _percentiles([accepted for accepted, _ in results]),
+        "complete": _percentiles([completed for _, completed in results]),
+        "failed": len(failures),
+        **_peak_rss_mb()
+    }
+
+
+def make_queries(count: int, seed: int = 0):
+    from .synthetic_corpus import SECTION_TITLES, WORDS
+
+    rng = random.Random(seed)
+    templates = (
+        "What does the {title} section say about {word}?",
+        "Summarize the {word} and {other} terms.",
+        "Which document mentions INV-{year}-{number:04d}?",
+        "Who is responsible for the {word} {other}?",
+    )
+    return [
+        rng.choice(templates).format(
+            title=rng.choice(SECTION_TITLES).lower(), word=rng.choice(WORDS), other=rng.choice(WORDS),
+            year=rng.randint(2020, 2025), number=rng.randint(0, 9999)
+        )
+        for _ in range(count)
+    ]
+
+
+def run_ask_phase(app, queries, clients: int, stream: bool = False):
+    headers = _auth_headers(app)
+    local = threading.local()
+    errors = []
+
+    def ask(query):
+        client = getattr(local, "client", None) or app.test_client()
+        local.client = client
+        start = time.perf_counter()
+        if not stream:
+            response = client.post("/api/ask", json={"query": query}, headers=headers)
+            if response.status_code != 200:
+                errors.append(response.get_json())
+            return time.perf_counter() - start, None
+
+        first_token = None
+        response = client.post("/api/ask/stream", json={"query": query}, headers=headers, buffered=False)
+        for chunk in response.iter_encoded():
+            if first_token is None and b"event: token" in chunk:
+                first_token = time.perf_counter() - start
+            if b"event: error" in chunk:
+                errors.append(chunk.decode("utf-8", "replace"))
+        response.close()
+        return time.perf_counter() - start, first_token
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        results = list(executor.map(ask, queries))
+    wall = time.perf_counter() - start
+
+    report = {
+        "endpoint": "/api/ask/stream" if stream else "/api/ask",
+        "queries": len(queries),
+        "clients": clients,
+        "wall_s": round(wall, 2),
+        "queries_per_sec": round(len(queries) / wall, 2),
+        **_percentiles([latency for latency, _ in results]),
+        "errors": len(errors),
+        **_peak_rss_mb()
+    }
+    if stream:
+        report["first_token"] = _percentiles([t for _, t in results if t is not None])
+    return report
+
+
+def run_benchmark(args):
+    from .fake_llm import offline_llms
+    from .synthetic_corpus import generate_corpus
+
+    workdir = tempfile.mkdtemp(prefix="e2e_benchmark_")
+    try:
+        _configure(workdir, args)
+        formats = tuple(args.formats)
+        corpus_options = {"formats": formats, "sections": args.sections, "words_per_section": args.words_per_section}
+        # Distinct seeds: the upload phase must not be deduplicated against the pipeline phase
+        pipeline_docs = generate_corpus(os.path.join(workdir, "corpus_pipeline"), args.docs, seed=args.seed, **corpus_options)
+        upload_docs = generate_corpus(os.path.join(workdir, "corpus_upload"), args.upload_docs, seed=args.seed + 1, **corpus_options)
+
+        app = _create_app()
+        report = {"settings": {k: v for k, v in vars(args).items() if k != "output"}}
+
+        with offline_llms(args.parse_latency, args.answer_latency, args.token_latency):
+            report["pipeline"] = run_pipeline_phase(app, pipeline_docs, args.concurrency, parser_mode=args.parser_mode)
+            print(json.dumps({"pipeline": report["pipeline"]}))
+            if upload_docs:
+                report["upload"] = run_upload_phase(app, upload_docs, args.concurrency)
+                print(json.dumps({"upload": report["upload"]}))
+            if args.queries:
+                queries = make_queries(args.queries, seed=args.seed)
+                report["ask"] = run_ask_phase(app, queries, args.clients)
+                print(json.dumps({"ask": report["ask"]}))
+                report["ask_stream"] = run_ask_phase(app, queries, args.clients, stream=True)
+                print(json.dumps({"ask_stream": report["ask_stream"]}))
+
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+        return report
+    finally:
+        if args.keep:
+            print(f"Work directory kept: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=30, help="documents for the pipeline phase")
+    parser.add_argument("--upload-docs", type=int, default=12, help="documents for the upload phase (0 to skip)")
+    parser.add_argument("--formats", nargs="+", default=["pdf", "docx", "txt"], choices=["pdf", "docx", "txt"])
+    parser.add_argument("--sections", type=int, default=6)
+    parser.add_argument("--words-per-section", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=4, help="documents ingested at a time")
+    parser.add_argument("--queries", type=int, default=100, help="questions per ask phase (0 to skip)")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent /api/ask clients")
+    parser.add_argument("--parse-latency", type=float, default=0.8, help="seconds per fake parse call")
+    parser.add_argument("--answer-latency", type=float, default=1.0, help="seconds before the first answer token")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="seconds per streamed answer token")
+    parser.add_argument("--parser-mode", choices=["llm", "structural"], default=None)
+    parser.add_argument("--pipeline-mode", choices=["batch", "streaming"], default=None)
+    parser.add_argument("--vector-backend", choices=["chroma", "numpy"], default=None)
+    parser.add_argument("--rate-limit", type=float, default=0, help="LLM calls per minute (0 = unlimited)")
+    parser.add_argument("--caches", action="store_true", help="keep parse, embedding and answer caches enabled")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the full report as JSON")
+    parser.add_argument("--keep", action="store_true", help="keep the work directory")
+    run_benchmark(parser.parse_args())
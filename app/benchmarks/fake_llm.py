@@ -0,0 +1,114 @@
+"""
+Offline stand-ins for Gemini with a configurable, deterministic latency.
+
+    with offline_llms(parse_latency=0.8, answer_latency=1.5, token_latency=0.02):
+        ...  # parsing and /api/ask run without network or quota
+
+The parser stub returns the dictionary format PARSE_PROMPT_TEMPLATE asks for, built from
+the chunk's own headings, so chunking, embedding and indexing see realistic input.
+"""
+import re
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+HEADING_PATTERN = re.compile(r"^([A-Z][A-Z0-9 ]{2,}):?\s*$", re.MULTILINE)
+
+
+class _FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGenaiModel:
+    """
+    Mimics google.generativeai.GenerativeModel.generate_content for the parsing service.
+    """
+
+    def __init__(self, model_name: str = "fake-parser", latency: float = 0.0):
+        self.model_name = model_name
+        self.api_key_hash = "offline"
+        self.latency = latency
+
+    def generate_content(self, prompt: str):
+        time.sleep(self.latency)
+        chunk = prompt.split("Here is the chunk of text:", 1)[-1].strip()
+
+        sections = []
+        matches = list(HEADING_PATTERN.finditer(chunk))
+        if not matches:
+            sections.append({"section_title": "Untitled Section", "text": chunk})
+        for i, match in enumerate(matches):
+            end = matches[i + 1].start() if i + 1 < len(matches) else len(chunk)
+            sections.append({"section_title": match.group(1).strip().title(), "text": chunk[match.end():end].strip()})
+
+        return _FakeResponse(repr({
+            "document_type": "report",
+            "metadata": {"source": "synthetic"},
+            "content": sections
+        }))
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model answering with the first words of the question's context, after `latency`
+    seconds, then `token_latency` seconds per streamed word.
+    """
+    latency: float = 0.0
+    token_latency: float = 0.0
+    answer_words: int = 60
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-benchmark"
+
+    def _answer(self, messages: List[BaseMessage]) -> str:
+        prompt = messages[-1].content if messages else ""
+        excerpts = prompt.split("Excerpts:", 1)[-1].split()
+        return " ".join(["According", "to", "the", "excerpts:"] + excerpts[:self.answer_words])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency + self.token_latency * self.answer_words)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._answer(messages)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency)
+        for word in self._answer(messages).split():
+            time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+
+
+@contextmanager
+def offline_llms(parse_latency: float = 0.0, answer_latency: float = 0.0, token_latency: float = 0.0):
+    """
+    Route the parsing service and the RAG service to the stubs for the duration of the block.
+    """
+    from langchain.chains.question_answering import load_qa_chain
+    from ..services import parsing_service, rag_service
+
+    parse_model = FakeGenaiModel(latency=parse_latency)
+    chat_model = FakeChatModel(latency=answer_latency, token_latency=token_latency)
+    chains = {}
+
+    def fake_qa_chain(prompt, llm_model=None, api_key=None):
+        if id(prompt) not in chains:
+            chains[id(prompt)] = load_qa_chain(chat_model, chain_type="stuff", prompt=prompt)
+        return chains[id(prompt)]
+
+    patches = {
+        (parsing_service, "get_genai_model"): lambda llm_model=None, api_key=None: parse_model,
+        (rag_service, "get_user_llm"): lambda llm_model=None, api_key=None, temperature=0.2: chat_model,
+        (rag_service, "get_qa_chain"): fake_qa_chain,
+        (rag_service, "resolve_api_key_hash"): lambda api_key=None: "offline",
+    }
+    originals = {target: getattr(*target) for target in patches}
+    for (module, name), replacement in patches.items():
+        setattr(module, name, replacement)
+    try:
+        yield parse_model, chat_model
+    finally:
+        for (module, name), original in originals.items():
+            setattr(module, name, original)
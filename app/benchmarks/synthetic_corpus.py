@@ -0,0 +1,115 @@
+"""
+Deterministic synthetic documents (PDF, DOCX, TXT) for the benchmarks.
+
+Each document has upper-case section headings followed by paragraphs of filler words and
+a few identifiers (invoice numbers, part numbers), so every parser and both retrieval
+paths (dense and BM25) get realistic work.
+"""
+import os
+import random
+
+WORDS = (
+    "contract invoice payment supplier delivery warranty period clause liability insurance "
+    "account balance statement customer order shipment quantity price discount tax total "
+    "report quarter revenue margin forecast budget expense audit compliance policy risk "
+    "employee manager department project milestone schedule deadline review approval "
+    "system network server storage backup recovery incident security access password "
+    "product feature release version update support request ticket priority status "
+    "meeting agenda minutes decision action owner follow-up summary conclusion appendix "
+    "the of and to in for with on by from as at is are was be this that which will may"
+).split()
+
+SECTION_TITLES = (
+    "INTRODUCTION", "SCOPE", "DEFINITIONS", "TERMS AND CONDITIONS", "PAYMENT SCHEDULE",
+    "DELIVERABLES", "RESPONSIBILITIES", "RISK ASSESSMENT", "FINANCIAL SUMMARY", "CONCLUSION"
+)
+
+
+def make_sections(rng: random.Random, sections: int, words_per_section: int, doc_index: int):
+    """
+    Return [(title, [paragraph, ...]), ...] for one document.
+    """
+    content = []
+    for s in range(sections):
+        title = f"{SECTION_TITLES[s % len(SECTION_TITLES)]} {s + 1}"
+        paragraphs = []
+        remaining = words_per_section
+        while remaining > 0:
+            length = min(remaining, rng.randint(40, 120))
+            words = [rng.choice(WORDS) for _ in range(length)]
+            words[rng.randrange(length)] = f"INV-{2020 + doc_index % 6}-{rng.randint(0, 9999):04d}"
+            words[0] = words[0].capitalize()
+            paragraphs.append(" ".join(words) + ".")
+            remaining -= length
+        content.append((title, paragraphs))
+    return content
+
+
+def write_txt(path: str, content):
+    with open(path, "w", encoding="utf-8") as f:
+        for title, paragraphs in content:
+            f.write(f"{title}:\n")
+            for paragraph in paragraphs:
+                f.write(paragraph + "\n\n")
+
+
+def write_docx(path: str, content):
+    from docx import Document as DocxDocument
+
+    document = DocxDocument()
+    for title, paragraphs in content:
+        document.add_heading(title.title(), level=1)
+        for paragraph in paragraphs:
+            document.add_paragraph(paragraph)
+    document.save(path)
+
+
+def write_pdf(path: str, content):
+    """
+    Text-layer PDF (no OCR needed): bold 15pt headings, 11pt body, A4 pages.
+    """
+    import fitz
+
+    pdf = fitz.open()
+    page, y = pdf.new_page(), 72
+
+    def place(text, fontsize, fontname, spacing):
+        nonlocal page, y
+        for _ in range(2):
+            if y > 770 - 2 * fontsize:
+                page, y = pdf.new_page(), 72
+            rect = fitz.Rect(72, y, 523, 770)
+            remaining = page.insert_textbox(rect, text, fontsize=fontsize, fontname=fontname)
+            if remaining >= 0:
+                y += rect.height - remaining + spacing
+                return
+            # Did not fit: nothing was written, start a new page
+            page, y = pdf.new_page(), 72
+
+    for title, paragraphs in content:
+        place(title, 15, "hebo", 6)
+        for paragraph in paragraphs:
+            place(paragraph, 11, "helv", 8)
+
+    pdf.save(path)
+    pdf.close()
+
+
+WRITERS = {"pdf": write_pdf, "docx": write_docx, "txt": write_txt}
+
+
+def generate_corpus(out_dir: str, count: int, formats=("pdf", "docx", "txt"), sections: int = 6,
+                    words_per_section: int = 400, seed: int = 0):
+    """
+    Write `count` documents to out_dir, cycling through `formats`. Returns their paths.
+    The same seed always produces the same files.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for i in range(count):
+        fmt = formats[i % len(formats)]
+        path = os.path.join(out_dir, f"synthetic_{seed}_{i:04d}.{fmt}")
+        WRITERS[fmt](path, make_sections(rng, sections, words_per_section, i))
+        paths.append(path)
+    return paths
@@ -0,0 +1,142 @@
+"""
+Compare the Chroma and NumPy vector-store backends on synthetic collections.
+
+    python -m app.benchmarks.vectorstore_benchmark --sizes 1000 10000 100000
+
+For each collection size it reports insert throughput, p50/p95 query latency and
+recall@k against exact search, so the backend (and NUMPY_HNSW_THRESHOLD) can be
+chosen from the real distribution of tenant sizes. The NumPy backend is also run with
+each NUMPY_QUANTIZATION mode (exact rescoring of the quantized first pass), with the
+memory its in-RAM vectors would take for 1M chunks.
+
+Random vectors are a pessimistic case for quantization: real embeddings are clustered,
+so recall loss measured on an exported collection is usually lower.
+"""
+import argparse
+import sys
+import shutil
+import tempfile
+import time
+import uuid
+import numpy as np
+from ..config import Config
+from ..services import numpy_vectorstore_service
+from ..services.numpy_vectorstore_service import QUANTIZATION_MODES
+
+DIM = 768
+USER = "benchmark@example.com"
+
+
+def _random_unit_vectors(n: int, rng) -> np.ndarray:
+    vectors = rng.standard_normal((n, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _memory_mb_per_million(name):
+    # Vector bytes held in memory per chunk; Chroma and unquantized NumPy search the float32
+    # rows (plus the HNSW graph links, ~2 * M * 4 bytes, for Chroma), quantized modes only
+    # keep the codes in memory and read float32 rows from disk for rescoring
+    per_vector = {
+        "chroma": DIM * 4 + 2 * 16 * 4,
+        "numpy": DIM * 4,
+        "numpy-int8": DIM + 4,
+        "numpy-binary": (DIM + 7) // 8
+    }[name]
+    return round(per_vector * 1_000_000 / 2 ** 20)
+
+
+def _percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 2)
+
+
+def _run_backend(name, add, query, vectors, queries, exact_top, k, batch_size):
+    ids = [str(uuid.uuid4()) for _ in range(len(vectors))]
+    metadatas = [{"doc_id": f"doc_{i // 20}", "user_email": USER} for i in range(len(vectors))]
+    texts = [f"chunk {i}" for i in range(len(vectors))]
+    row_of = {chunk_id: row for row, chunk_id in enumerate(ids)}
+
+    start = time.perf_counter()
+    for offset in range(0, len(vectors), batch_size):
+        end = offset + batch_size
+        add(texts[offset:end], ids[offset:end], metadatas[offset:end], vectors[offset:end].tolist())
+    insert_seconds = time.perf_counter() - start
+
+    latencies, recalls = [], []
+    for query_vector, expected in zip(queries, exact_top):
+        start = time.perf_counter()
+        found = query(query_vector, k)
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len({row_of[chunk_id] for chunk_id in found} & set(expected)) / k)
+
+    return {
+        "backend": name,
+        "inserts_per_sec": round(len(vectors) / insert_seconds),
+        "p50_ms": _percentile_ms(latencies, 50),
+        "p95_ms": _percentile_ms(latencies, 95),
+        f"recall@{k}": round(float(np.mean(recalls)), 4),
+        "vector_memory_mb_per_1m": _memory_mb_per_million(name)
+    }
+
+
+def run_benchmark(sizes, num_queries=100, k=10, batch_size=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    results = []
+    hnsw_threshold, default_quantization = Config.NUMPY_HNSW_THRESHOLD, Config.NUMPY_QUANTIZATION
+    vector_dir = Config.NUMPY_VECTOR_DIR
+
+    for size in sizes:
+        vectors = _random_unit_vectors(size, rng)
+        queries = _random_unit_vectors(num_queries, rng)
+        exact_top = [np.argsort(-(vectors @ q))[:k].tolist() for q in queries]
+
+        workdir = tempfile.mkdtemp(prefix="vector_benchmark_")
+        try:
+            import chromadb
+            client = chromadb.PersistentClient(path=f"{workdir}/chroma")
+            collection = client.create_collection(name="benchmark", metadata={"hnsw:space": "cosine"})
+
+            def chroma_add(texts, ids, metadatas, embeddings):
+                collection.add(documents=texts, ids=ids, metadatas=metadatas, embeddings=embeddings)
+
+            def chroma_query(query_vector, k):
+                return collection.query(query_embeddings=[query_vector.tolist()], n_results=k)["ids"][0]
+
+            def numpy_add(texts, ids, metadatas, embeddings):
+                numpy_vectorstore_service.add(texts, ids, metadatas, embeddings, user_email=USER)
+
+            def numpy_query(query_vector, k):
+                return numpy_vectorstore_service.query([query_vector], USER, k=k)["ids"][0]
+
+            result = _run_backend("chroma", chroma_add, chroma_query, vectors, queries, exact_top, k, batch_size)
+            result["size"] = size
+            results.append(result)
+            print(result)
+
+            for quantization in QUANTIZATION_MODES:
+                name = "numpy" if quantization == "none" else f"numpy-{quantization}"
+                Config.NUMPY_VECTOR_DIR = f"{workdir}/{name}"
+                Config.NUMPY_QUANTIZATION = quantization
+                # Quantization applies to the exact-search path, so keep HNSW out of those runs
+                Config.NUMPY_HNSW_THRESHOLD = hnsw_threshold if quantization == "none" else sys.maxsize
+                numpy_vectorstore_service._stores.clear()
+
+                result = _run_backend(name, numpy_add, numpy_query, vectors, queries, exact_top, k, batch_size)
+                result["size"] = size
+                results.append(result)
+                print(result)
+        finally:
+            numpy_vectorstore_service._stores.clear()
+            Config.NUMPY_HNSW_THRESHOLD, Config.NUMPY_QUANTIZATION = hnsw_threshold, default_quantization
+            Config.NUMPY_VECTOR_DIR = vector_dir
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+    run_benchmark(args.sizes, num_queries=args.queries, k=args.k)
@@ -4,10 +4,136 @@ from datetime import timedelta
 
 load_dotenv()  # Load environment variables from .env file
 
+# Accepted values of DEFAULT_PARSER_MODE and of the per-user / per-upload parser_mode
+PARSER_MODES = ("llm", "structural")
+
 class Config:
     JWT_SECRET_KEY = os.getenv('SECRET_KEY')
     basedir = os.path.abspath(os.path.dirname(__file__))
     db_path = os.path.join(basedir, 'db', 'instance', 'resumes.db')
     os.makedirs(os.path.dirname(db_path), exist_ok=True)
     SQLALCHEMY_DATABASE_URI = f'sqlite:///{db_path}'
-    JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=5)
\ No newline at end of file
+    JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=5)
+
+    # Background ingestion
+    INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', 2))
+    INGEST_UPLOAD_DIR = os.getenv('INGEST_UPLOAD_DIR', '/tmp/ingest')
+    # Jobs whose owning process cannot be identified (no /proc) are failed at startup after this long without progress
+    INGEST_STALE_SECONDS = int(os.getenv('INGEST_STALE_SECONDS', 30 * 60))
+
+    # LLM parsing
+    PARSE_CONCURRENCY = int(os.getenv('PARSE_CONCURRENCY', 4))
+    PARSE_MAX_RETRIES = int(os.getenv('PARSE_MAX_RETRIES', 2))  # unparsable LLM output; API errors use LLM_MAX_RETRIES
+
+    # LLM parse-result cache
+    PARSE_CACHE_ENABLED = os.getenv('PARSE_CACHE_ENABLED', 'true').lower() == 'true'
+    PARSE_CACHE_PATH = os.getenv('PARSE_CACHE_PATH', os.path.join(basedir, 'db', 'cache', 'parse_cache.db'))
+    PARSE_CACHE_MAX_BYTES = int(os.getenv('PARSE_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+    # Text extraction
+    EXTRACT_WORKERS = int(os.getenv('EXTRACT_WORKERS', os.cpu_count() or 1))
+    EXTRACT_PARALLEL_MIN_PAGES = int(os.getenv('EXTRACT_PARALLEL_MIN_PAGES', 8))
+    # Pages per pool task: at most EXTRACT_WORKERS * 2 tasks are in flight, whatever the page count
+    PDF_PAGES_PER_TASK = int(os.getenv('PDF_PAGES_PER_TASK', 4))
+    OCR_DPI = int(os.getenv('OCR_DPI', 72))
+
+    # Ingestion pipeline: "batch" processes the whole document at each step, "streaming" works in bounded batches
+    INGEST_PIPELINE_MODE = os.getenv('INGEST_PIPELINE_MODE', 'batch')
+    INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', 64))
+
+    # Document parser: "llm" (Gemini) or "structural" (local headings, LLM as fallback)
+    DEFAULT_PARSER_MODE = os.getenv('DEFAULT_PARSER_MODE', 'llm')
+
+    # Embeddings and chunking (all-mpnet-base-v2 truncates input at 384 word-pieces)
+    EMBEDDING_MODEL_NAME = os.getenv('EMBEDDING_MODEL_NAME', 'sentence-transformers/all-mpnet-base-v2')
+    EMBEDDING_MAX_SEQ_LENGTH = int(os.getenv('EMBEDDING_MAX_SEQ_LENGTH', 384))
+    # "torch" (SentenceTransformer) or "onnx" (ONNX Runtime, optionally int8-quantized)
+    EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch')
+    EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', 32))
+    EMBEDDING_THREADS = int(os.getenv('EMBEDDING_THREADS', 0))  # 0 = library default
+    ONNX_MODEL_DIR = os.getenv('ONNX_MODEL_DIR', os.path.join(basedir, 'db', 'onnx_model'))
+    ONNX_QUANTIZE = os.getenv('ONNX_QUANTIZE', 'true').lower() == 'true'
+
+    # Embedding caches: in-process LRU for queries, persistent float16 store for chunks (LRU-evicted above EMBEDDING_CACHE_MAX_BYTES)
+    QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', 1024))
+    EMBEDDING_CACHE_ENABLED = os.getenv('EMBEDDING_CACHE_ENABLED', 'true').lower() == 'true'
+    EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH', os.path.join(basedir, 'db', 'cache', 'embedding_cache.db'))
+    EMBEDDING_CACHE_MAX_BYTES = int(os.getenv('EMBEDDING_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+    # Shared embedding server (python -m app.services.embedding_server); empty = embed in-process
+    EMBEDDING_SERVER_SOCKET = os.getenv('EMBEDDING_SERVER_SOCKET', '')
+    EMBEDDING_SERVER_MAX_BATCH = int(os.getenv('EMBEDDING_SERVER_MAX_BATCH', 64))
+    EMBEDDING_SERVER_MAX_WAIT_MS = float(os.getenv('EMBEDDING_SERVER_MAX_WAIT_MS', 5))
+    CHUNK_MAX_TOKENS = int(os.getenv('CHUNK_MAX_TOKENS', 320))
+    CHUNK_OVERLAP_TOKENS = int(os.getenv('CHUNK_OVERLAP_TOKENS', 48))
+
+    # Startup: "eager" loads models in create_app, "lazy" on first use,
+    # "preload" in the gunicorn master (run gunicorn with --preload) with warmup in each worker
+    STARTUP_MODE = os.getenv('STARTUP_MODE', 'eager')
+
+    # Retrieval: dense Chroma search fused with a per-user BM25 index (reciprocal-rank fusion)
+    HYBRID_RETRIEVAL = os.getenv('HYBRID_RETRIEVAL', 'true').lower() == 'true'
+    HYBRID_CANDIDATES = int(os.getenv('HYBRID_CANDIDATES', 20))
+    RRF_K = int(os.getenv('RRF_K', 60))
+    RETRIEVAL_MAX_FETCH = int(os.getenv('RETRIEVAL_MAX_FETCH', 200))
+    DOCUMENT_METADATA_CACHE_SIZE = int(os.getenv('DOCUMENT_METADATA_CACHE_SIZE', 4096))
+    DOCUMENT_METADATA_CACHE_TTL = int(os.getenv('DOCUMENT_METADATA_CACHE_TTL', 300))
+    SPARSE_INDEX_DIR = os.getenv('SPARSE_INDEX_DIR', os.path.join(basedir, 'db', 'sparse_index'))
+
+    # Gemini throttling per API key: token bucket shared by the workers of this host, concurrent
+    # calls per key and process, retries on 429/5xx. Interactive calls get LLM_INTERACTIVE_RESERVE
+    # of the bucket and go ahead of bulk parsing.
+    LLM_RATE_LIMIT_PER_MINUTE = float(os.getenv('LLM_RATE_LIMIT_PER_MINUTE', 60))  # 0 = no rate limit
+    LLM_BURST = int(os.getenv('LLM_BURST', 10))
+    LLM_INTERACTIVE_RESERVE = float(os.getenv('LLM_INTERACTIVE_RESERVE', 0.2))
+    LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 8))
+    LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 5))
+    LLM_BACKOFF_BASE = float(os.getenv('LLM_BACKOFF_BASE', 1.0))
+    LLM_BACKOFF_MAX = float(os.getenv('LLM_BACKOFF_MAX', 60))
+    LLM_QUEUE_TIMEOUT = float(os.getenv('LLM_QUEUE_TIMEOUT', 240))
+    LLM_RATE_LIMIT_PATH = os.getenv('LLM_RATE_LIMIT_PATH', os.path.join(basedir, 'db', 'cache', 'rate_limit.db'))
+
+    # Async serving mode (uvicorn app.asgi:app): threads for the blocking part of the async
+    # routes (retrieval, database) and for the Flask routes served through WSGI
+    ASGI_SYNC_THREADS = int(os.getenv('ASGI_SYNC_THREADS', 8))
+    ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', 10))
+
+    # Reused LLM clients/chains (keyed by model and API key hash) and cached user LLM settings.
+    # Settings updates only clear the cache of the worker that handled them: other workers keep
+    # using the previous model/API key for up to USER_SETTINGS_CACHE_TTL seconds.
+    LLM_POOL_SIZE = int(os.getenv('LLM_POOL_SIZE', 64))
+    USER_SETTINGS_CACHE_SIZE = int(os.getenv('USER_SETTINGS_CACHE_SIZE', 4096))
+    USER_SETTINGS_CACHE_TTL = int(os.getenv('USER_SETTINGS_CACHE_TTL', 30))
+
+    # Per-user answer cache for /api/ask, keyed on the normalized question and the retrieved
+    # context; questions whose embedding is within ANSWER_CACHE_SIMILARITY (cosine) of a cached
+    # one over the same context also hit (1 disables near-duplicate matching)
+    ANSWER_CACHE_ENABLED = os.getenv('ANSWER_CACHE_ENABLED', 'true').lower() == 'true'
+    ANSWER_CACHE_SIZE = int(os.getenv('ANSWER_CACHE_SIZE', 1024))
+    ANSWER_CACHE_TTL = int(os.getenv('ANSWER_CACHE_TTL', 3600))
+    ANSWER_CACHE_SIMILARITY = float(os.getenv('ANSWER_CACHE_SIMILARITY', 0.95))
+
+    # Cross-encoder reranking of over-fetched candidates (can be enabled per /api/ask request)
+    RERANK_ENABLED = os.getenv('RERANK_ENABLED', 'false').lower() == 'true'
+    RERANK_MODEL_NAME = os.getenv('RERANK_MODEL_NAME', 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+    RERANK_CANDIDATES = int(os.getenv('RERANK_CANDIDATES', 30))
+    RERANK_MAX_CANDIDATES = int(os.getenv('RERANK_MAX_CANDIDATES', 100))  # cap on a request's rerank_candidates
+    RERANK_BATCH_SIZE = int(os.getenv('RERANK_BATCH_SIZE', 16))
+    RERANK_BUDGET_MS = float(os.getenv('RERANK_BUDGET_MS', 300))
+
+    # Vector store backend: "chroma" or "numpy" (memory-mapped matrix per user, exact search
+    # below NUMPY_HNSW_THRESHOLD live chunks, HNSW above it when hnswlib is installed)
+    VECTOR_BACKEND = os.getenv('VECTOR_BACKEND', 'chroma')
+    NUMPY_VECTOR_DIR = os.getenv('NUMPY_VECTOR_DIR', os.path.join(basedir, 'db', 'numpy_vectors'))
+    NUMPY_HNSW_THRESHOLD = int(os.getenv('NUMPY_HNSW_THRESHOLD', 50000))
+    NUMPY_HNSW_EF = int(os.getenv('NUMPY_HNSW_EF', 128))
+    # Quantized first pass for exact search: "none", "int8" (4x smaller) or "binary" (32x smaller);
+    # the best k * NUMPY_RESCORE_FACTOR candidates are rescored with the float32 rows on disk
+    NUMPY_QUANTIZATION = os.getenv('NUMPY_QUANTIZATION', 'none')
+    NUMPY_RESCORE_FACTOR = int(os.getenv('NUMPY_RESCORE_FACTOR', 10))
+
+    # Background maintenance (orphaned chunks, compaction, VACUUM); 0 disables the scheduler.
+    # Run once by hand with: python -m app.services.maintenance_service [--dry-run]
+    MAINTENANCE_INTERVAL_SECONDS = int(os.getenv('MAINTENANCE_INTERVAL_SECONDS', 0))
+    MAINTENANCE_INGEST_GRACE_SECONDS = int(os.getenv('MAINTENANCE_INGEST_GRACE_SECONDS', 6 * 3600))
+    MAINTENANCE_LOCK_DIR = os.getenv('MAINTENANCE_LOCK_DIR', os.path.join(basedir, 'db'))
@@ -10,9 +10,16 @@ class Document(db.Model):
     author = db.Column(db.String, nullable=True)
     date = db.Column(db.String, nullable=True)
     tags = db.Column(db.PickleType, nullable=True)
+    content_hash = db.Column(db.String(64), nullable=True)  # SHA-256 of file_data, used for deduplication
 
     # 🔗 Link to User
     user_email = db.Column(db.String(25), db.ForeignKey('user.email'), nullable=False)
 
     # Relationship (so you can do user.documents or doc.user)
     user = db.relationship("User", backref=db.backref("documents", lazy=True))
+
+    __table_args__ = (
+        db.Index("ix_document_user_email_file_name", "user_email", "file_name"),
+        # One stored copy per content and user; legacy duplicates hold a unique "duplicate:<id>" marker
+        db.Index("ux_document_user_email_content_hash", "user_email", "content_hash", unique=True),
+    )
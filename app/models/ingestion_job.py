@@ -0,0 +1,27 @@
+from ..extentions import db
+from datetime import datetime
+
+class IngestionJob(db.Model):
+    id = db.Column(db.String, primary_key=True)
+    user_email = db.Column(db.String(25), db.ForeignKey('user.email'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default="queued")  # queued | running | done | failed
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    worker = db.Column(db.String(40), nullable=True)  # "pid:start time" of the process running the files
+
+    # Relationship
+    files = db.relationship("IngestionFile", backref="job", lazy=True, order_by="IngestionFile.id")
+
+
+class IngestionFile(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    job_id = db.Column(db.String, db.ForeignKey('ingestion_job.id'), nullable=False, index=True)
+    filename = db.Column(db.String, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default="queued")  # queued | running | done | failed
+    stage = db.Column(db.String(20), nullable=True)  # extract | parse | chunk | embed | upsert
+    progress = db.Column(db.Float, nullable=False, default=0.0)
+    document_id = db.Column(db.String, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=True)  # last status/progress write, used as a heartbeat
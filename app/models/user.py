@@ -8,4 +8,5 @@ class User(db.Model):
     numeroTel = db.Column(db.Integer, nullable=False)
     dateNaissance = db.Column(db.Date, nullable=False)
     llm_model = db.Column(db.String(100), nullable=True)
-    api_key = db.Column(db.String(255), nullable=True) 
\ No newline at end of file
+    api_key = db.Column(db.String(255), nullable=True)
+    parser_mode = db.Column(db.String(20), nullable=True)  # "llm" | "structural", defaults to DEFAULT_PARSER_MODE 
\ No newline at end of file
@@ -1,8 +1,8 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from ..services.treatment_pipeline_service import process_document_pipeline
+from ..services.ingestion_job_service import create_ingestion_job, get_ingestion_job, serialize_ingestion_job
+from ..config import PARSER_MODES
 import traceback
-import os
 
 document_bp = Blueprint("document", __name__)
 
@@ -13,35 +13,41 @@ def process_document():
         return jsonify({"error": "No files provided"}), 400
 
     files = request.files.getlist("files")
-    processed_documents = []
-    current_user = get_jwt_identity()  
-    
-    try:
-        for file in files:
-            file_path = f"/tmp/{file.filename}"
-            file.save(file_path)
-
-            document_url = request.form.get("document_url", "")
+    current_user = get_jwt_identity()
+    document_url = request.form.get("document_url", "")
 
-            document_id = process_document_pipeline(
-                file_path,
-                document_url=document_url,
-                user_email=current_user
-            )
+    # Optional per-upload parser choice, otherwise the user's setting applies
+    parser_mode = request.form.get("parser_mode")
+    if parser_mode and parser_mode not in PARSER_MODES:
+        return jsonify({"error": f"parser_mode must be one of {', '.join(PARSER_MODES)}"}), 400
 
-            processed_documents.append({
-                "filename": file.filename,
-                "document_id": document_id,
-                "document_url": document_url
-            })
+    try:
+        # Files are processed by the background worker pool; poll the job for progress
+        job = create_ingestion_job(
+            files,
+            user_email=current_user,
+            document_url=document_url,
+            pipeline_options={"parser_mode": parser_mode}
+        )
 
         return jsonify({
-            "message": f"{len(processed_documents)} documents processed successfully",
+            "message": f"{len(files)} documents queued for processing",
             "user": current_user,
-            "documents": processed_documents
-        })
+            "job": serialize_ingestion_job(job)
+        }), 202
 
     except Exception as e:
         tb = traceback.format_exc()
         print(tb)
         return jsonify({"error": str(e), "traceback": tb}), 500
+
+
+@document_bp.route("/process-document/<job_id>", methods=["GET"])
+@jwt_required()
+def get_processing_status(job_id):
+    """Get per-file stage, progress and errors of an ingestion job"""
+    current_user = get_jwt_identity()
+    job = get_ingestion_job(job_id, user_email=current_user)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(serialize_ingestion_job(job))
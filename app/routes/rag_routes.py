@@ -1,6 +1,7 @@
-from flask import Blueprint, request, jsonify
+import json
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from ..services.rag_service import generate_rag_response
+from ..services.rag_service import generate_rag_response, stream_rag_response, parse_rerank_options
 from ..models.chat_history import ChatHistory
 from ..extentions import db
 
@@ -16,9 +17,14 @@ def ask_question():
     query = data['query']
     current_user = get_jwt_identity()  # logged-in user email
 
+    # Optional per-request reranking: {"rerank": true, "rerank_candidates": 30}
     try:
-        # Pass the user_email here
-        response = generate_rag_response(query)
+        rerank, rerank_candidates = parse_rerank_options(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        response = generate_rag_response(query, rerank=rerank, rerank_candidates=rerank_candidates)
 
         # Save to chat history
         chat_entry = ChatHistory(
@@ -36,3 +42,58 @@ def ask_question():
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@qa_bp.route("/ask/stream", methods=["POST"])
+@jwt_required()
+def ask_question_stream():
+    """
+    Same request body as /ask, answered as Server-Sent Events:
+    "sources" (ranked documents), then "token" events, then "done" (full answer, timings)
+    or "error". The chat history entry is written once the answer is complete.
+    """
+    data = request.get_json()
+    if not data or 'query' not in data:
+        return jsonify({"error": "Missing 'query' in request body"}), 400
+
+    query = data['query']
+    current_user = get_jwt_identity()
+    try:
+        rerank, rerank_candidates = parse_rerank_options(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def generate():
+        sources = []
+        try:
+            for event, payload in stream_rag_response(
+                query,
+                user_email=str(current_user),
+                rerank=rerank,
+                rerank_candidates=rerank_candidates
+            ):
+                if event == "sources":
+                    sources = payload["ranked_documents"]
+                elif event == "done":
+                    chat_entry = ChatHistory(
+                        user_email=current_user,
+                        question=query,
+                        answer=payload["answer"],
+                        sources=sources
+                    )
+                    db.session.add(chat_entry)
+                    db.session.commit()
+                yield _sse(event, payload)
+        except Exception as e:
+            db.session.rollback()
+            yield _sse("error", {"error": str(e)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        # Keep proxies (nginx) from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
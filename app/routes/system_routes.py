@@ -0,0 +1,34 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from ..services.parse_cache_service import get_parse_cache_stats
+from ..services.embedding_cache_service import get_embedding_cache_stats
+from ..services.startup_service import get_readiness
+from ..services.answer_cache_service import get_answer_cache_stats
+from ..services.llm_service import get_llm_pool_stats
+from ..services.maintenance_service import maintain_user
+
+system_bp = Blueprint("system", __name__)
+
+@system_bp.route("/ready", methods=["GET"])
+def readiness():
+    """Readiness probe: 200 once models are warm (immediately in lazy mode), 503 before"""
+    report = get_readiness()
+    return jsonify(report), 200 if report["ready"] else 503
+
+@system_bp.route("/cache/stats", methods=["GET"])
+@jwt_required()
+def get_cache_stats():
+    """Hit rates of this worker's parse, embedding and answer caches and of its LLM client pool"""
+    return jsonify({
+        "parse_cache": get_parse_cache_stats(),
+        "embedding_cache": get_embedding_cache_stats(),
+        "answer_cache": get_answer_cache_stats(),
+        "llm_pool": get_llm_pool_stats()
+    })
+
+@system_bp.route("/maintenance", methods=["POST"])
+@jwt_required()
+def run_user_maintenance():
+    """Remove the current user's orphaned chunks and compact their indexes (?dry_run=true to only report)"""
+    dry_run = request.args.get("dry_run", "false").lower() == "true"
+    return jsonify(maintain_user(get_jwt_identity(), dry_run=dry_run))
@@ -3,6 +3,7 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from ..services.user_service import Create_user, Get_user_by_email, Update_user_llm, Get_user_llm
 from ..schemas.user_schema import UserSchema
+from ..config import PARSER_MODES
 
 
 user_bp = Blueprint('user', __name__)
@@ -47,12 +48,14 @@ def get_llm():
         return jsonify({
             "llm_model": None,
             "api_key": None,
+            "parser_mode": None,
             "has_api_key": False
         }), 200
 
     return jsonify({
         "llm_model": user_settings.get("llm_model"),
         "api_key": user_settings.get("api_key"),
+        "parser_mode": user_settings.get("parser_mode"),
         "has_api_key": user_settings.get("api_key") is not None
     }), 200
 
@@ -64,8 +67,12 @@ def update_llm():
 
     llm_model = data.get("llm_model")
     api_key = data.get("api_key")
+    parser_mode = data.get("parser_mode")
 
-    user = Update_user_llm(current_user_email, llm_model=llm_model, api_key=api_key)
+    if parser_mode is not None and parser_mode not in PARSER_MODES:
+        return jsonify({"message": f"parser_mode must be one of {', '.join(PARSER_MODES)}"}), 400
+
+    user = Update_user_llm(current_user_email, llm_model=llm_model, api_key=api_key, parser_mode=parser_mode)
 
     if not user:
         return jsonify({"message": "User not found"}), 404
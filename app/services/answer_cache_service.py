@@ -0,0 +1,99 @@
+import hashlib
+import re
+import threading
+import numpy as np
+from cachetools import TTLCache
+from ..config import Config
+
+# Per-process cache of /api/ask answers:
+#   (user_email, llm_model, context fingerprint, normalized query) -> (query embedding, answer, sources)
+# The context fingerprint covers the chunks retrieved for the question, so an answer is only
+# reused when the LLM would see exactly the same excerpts. Ingests and deletes handled by this
+# process drop the user's entries right away; in other workers a changed retrieval result
+# changes the fingerprint, and the TTL bounds everything else.
+_cache = TTLCache(maxsize=Config.ANSWER_CACHE_SIZE, ttl=Config.ANSWER_CACHE_TTL)
+_lock = threading.Lock()
+_stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0}
+
+
+def normalize_query(query: str) -> str:
+    """
+    Case, surrounding punctuation and whitespace do not change the question.
+    """
+    return re.sub(r"\s+", " ", query.strip().lower()).strip(" ?!.;:")
+
+
+def context_fingerprint(documents) -> str:
+    """
+    Hash of the retrieved LangChain documents (document id and excerpt text), order-independent.
+    """
+    h = hashlib.sha256()
+    for document_id, text in sorted((str(d.metadata.get("document_id")), d.page_content) for d in documents):
+        h.update(document_id.encode("utf-8"))
+        h.update(b"\0")
+        h.update(text.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def get_cached_answer(user_email: str, llm_model: str, fingerprint: str, query: str, query_embedding=None):
+    """
+    Return (answer, sources, match) for a cached answer, match being "exact" or "semantic",
+    or None. The semantic match compares query embeddings among the entries that were
+    answered from the same context.
+    """
+    if not Config.ANSWER_CACHE_ENABLED:
+        return None
+
+    normalized = normalize_query(query)
+    with _lock:
+        entry = _cache.get((user_email, llm_model, fingerprint, normalized))
+        if entry is not None:
+            _stats["exact_hits"] += 1
+            return entry[1], entry[2], "exact"
+
+        if query_embedding is not None and Config.ANSWER_CACHE_SIMILARITY < 1:
+            query_vector = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+            best, best_similarity = None, Config.ANSWER_CACHE_SIMILARITY
+            for key, (embedding, answer, sources) in list(_cache.items()):
+                if key[:3] != (user_email, llm_model, fingerprint) or embedding is None:
+                    continue
+                similarity = float(np.dot(query_vector, embedding) / max(
+                    np.linalg.norm(query_vector) * np.linalg.norm(embedding), 1e-12
+                ))
+                if similarity >= best_similarity:
+                    best, best_similarity = (answer, sources), similarity
+            if best is not None:
+                _stats["semantic_hits"] += 1
+                return best[0], best[1], "semantic"
+
+        _stats["misses"] += 1
+    return None
+
+
+def set_cached_answer(user_email: str, llm_model: str, fingerprint: str, query: str, answer: str, sources, query_embedding=None):
+    if not Config.ANSWER_CACHE_ENABLED:
+        return
+    embedding = None if query_embedding is None else np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+    with _lock:
+        _cache[(user_email, llm_model, fingerprint, normalize_query(query))] = (embedding, answer, sources)
+
+
+def invalidate_user_answers(user_email: str):
+    """
+    Drop every cached answer of a user (called when their documents change).
+    """
+    with _lock:
+        for key in [key for key in _cache.keys() if key[0] == user_email]:
+            _cache.pop(key, None)
+
+
+def get_answer_cache_stats():
+    with _lock:
+        lookups = sum(_stats.values())
+        hits = _stats["exact_hits"] + _stats["semantic_hits"]
+        return {
+            **_stats,
+            "entries": len(_cache),
+            "hit_rate": round(hits / lookups, 4) if lookups else None
+        }
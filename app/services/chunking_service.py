@@ -1,5 +1,7 @@
 import uuid
 from typing import List, Dict, Any
+from ..config import Config
+from .embedding_service import get_tokenizer
 
 def add_chunk(chunks, doc_id, text, section_title, image_url=None, extra_metadata=None):
     """Add a single text chunk with metadata."""
@@ -26,12 +28,41 @@ def add_chunk(chunks, doc_id, text, section_title, image_url=None, extra_metadat
     return chunks
 
 
-def chunk_document(doc_dict: Dict[str, Any], image_url: str = None):
+def split_into_token_windows(text: str, max_tokens: int = None, overlap_tokens: int = None):
+    """
+    Split text into windows of at most `max_tokens` embedding-model tokens, consecutive
+    windows sharing `overlap_tokens` tokens. The text is tokenized once and windows are
+    cut on token offsets, so this is linear in the text length.
+
+    Returns a list of (window_text, char_start, char_end).
+    """
+    max_tokens = max_tokens or Config.CHUNK_MAX_TOKENS
+    overlap_tokens = Config.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    step = max(1, max_tokens - overlap_tokens)
+
+    offsets = get_tokenizer()(text, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+    if len(offsets) <= max_tokens:
+        return [(text, 0, len(text))]
+
+    windows = []
+    for start in range(0, len(offsets), step):
+        end = min(start + max_tokens, len(offsets))
+        char_start, char_end = offsets[start][0], offsets[end - 1][1]
+        windows.append((text[char_start:char_end], char_start, char_end))
+        if end == len(offsets):
+            break
+    return windows
+
+
+def chunk_document(doc_dict: Dict[str, Any], image_url: str = None, doc_id: str = None):
     """
     Convert a parsed document dictionary (from LLM) into RAG-ready chunks.
+    Sections longer than CHUNK_MAX_TOKENS are split into overlapping windows so the
+    whole text fits in the embedding model; offsets within the section are kept in metadata.
+    Pass `doc_id` when chunking a document piece by piece (streaming pipeline).
     """
     chunks = []
-    doc_id = str(uuid.uuid4())
+    doc_id = doc_id or str(uuid.uuid4())
 
     # Extract metadata and document type
     doc_type = doc_dict.get("document_type", "unknown")
@@ -45,6 +76,16 @@ def chunk_document(doc_dict: Dict[str, Any], image_url: str = None):
     for section in content_list:
         section_title = section.get("section_title", "Untitled Section")
         text = section.get("text", "")
-        chunks = add_chunk(chunks, doc_id, text, section_title, image_url, base_metadata)
+        if not text.strip():
+            continue
+
+        for window_index, (window_text, char_start, char_end) in enumerate(split_into_token_windows(text)):
+            window_metadata = {
+                **base_metadata,
+                "window_index": window_index,
+                "char_start": char_start,
+                "char_end": char_end
+            }
+            chunks = add_chunk(chunks, doc_id, window_text, section_title, image_url, window_metadata)
 
     return chunks, doc_id
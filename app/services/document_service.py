@@ -1,14 +1,110 @@
+import fcntl
 import mimetypes
+import hashlib
+import os
+import threading
+from cachetools import TTLCache
 from ..models.document import Document
 from ..extentions import db
+from ..config import Config
+from .vectorstore_service import delete_document_vectors
+from .sparse_index_service import delete_document_sparse
+from .answer_cache_service import invalidate_user_answers
 
-def save_document(file_id: str, file_path: str, user_email: str, document_type: str = "", extra_metadata: dict = None):
+# Light per-process cache of document labels used to assemble retrieval results.
+# Entries are dropped on save/delete in this process; the TTL bounds staleness across workers.
+_metadata_cache = TTLCache(maxsize=Config.DOCUMENT_METADATA_CACHE_SIZE, ttl=Config.DOCUMENT_METADATA_CACHE_TTL)
+_metadata_lock = threading.Lock()
+
+
+def invalidate_document_metadata(file_id: str, user_email: str):
+    with _metadata_lock:
+        _metadata_cache.pop((user_email, file_id), None)
+
+def compute_content_hash(file_path: str) -> str:
+    """
+    SHA-256 of a file's bytes, read in blocks so large uploads are not loaded twice.
+    """
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def find_document_by_hash(content_hash: str, user_email: str):
+    """
+    Return the id of a user's document with the same content, or None.
+    """
+    row = Document.query.filter_by(content_hash=content_hash, user_email=user_email).with_entities(Document.id).first()
+    return row[0] if row else None
+
+
+def _duplicate_marker(doc_id: str) -> str:
+    # Unique per row, and never the hex digest of any file: such rows are marked as
+    # checked without being matched by later uploads
+    return f"duplicate:{doc_id}"
+
+
+def backfill_content_hashes(batch_size: int = 100):
+    """
+    Hash documents stored before content_hash existed, so they are deduplicated too,
+    then make sure the (user_email, content_hash) unique index exists. Runs at startup;
+    workers take turns on a file lock and every row is processed once, so later boots
+    only find nothing left to do.
+    """
+    os.makedirs(Config.MAINTENANCE_LOCK_DIR, exist_ok=True)
+    with open(os.path.join(Config.MAINTENANCE_LOCK_DIR, "content_hash_backfill.lock"), "a+") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        _backfill_content_hashes_locked(batch_size)
+
+
+def _backfill_content_hashes_locked(batch_size: int):
+    # Identical copies stored before deduplication (or by a race before the unique index)
+    # get a duplicate marker: only the oldest copy is matched by later uploads
+    duplicates = db.session.query(Document.user_email, Document.content_hash).filter(
+        Document.content_hash.isnot(None)
+    ).group_by(Document.user_email, Document.content_hash).having(db.func.count() > 1).all()
+    for user_email, content_hash in duplicates:
+        copies = Document.query.filter_by(user_email=user_email, content_hash=content_hash).order_by(Document.id).all()
+        for copy in copies[1:]:
+            copy.content_hash = _duplicate_marker(copy.id)
+    db.session.commit()
+
+    missing = [doc_id for (doc_id,) in db.session.query(Document.id).filter(Document.content_hash.is_(None))]
+    if missing:
+        taken = {
+            (user_email, content_hash) for user_email, content_hash in
+            db.session.query(Document.user_email, Document.content_hash).filter(Document.content_hash.isnot(None))
+        }
+    for i, doc_id in enumerate(missing, start=1):
+        # One blob at a time
+        user_email, file_data = db.session.query(Document.user_email, Document.file_data).filter_by(id=doc_id).one()
+        key = (user_email, hashlib.sha256(file_data).hexdigest())
+        if key in taken:
+            content_hash = _duplicate_marker(doc_id)
+        else:
+            taken.add(key)
+            content_hash = key[1]
+        Document.query.filter_by(id=doc_id).update({"content_hash": content_hash})
+        if i % batch_size == 0:
+            db.session.commit()
+    db.session.commit()
+
+    for index in Document.__table__.indexes:
+        index.create(bind=db.engine, checkfirst=True)
+
+
+def save_document(file_id: str, file_path: str, user_email: str, document_type: str = "", extra_metadata: dict = None, content_hash: str = None):
     """
     Save a document in the database linked to a specific user.
     """
     with open(file_path, "rb") as f:
         file_bytes = f.read()
 
+    if content_hash is None:
+        content_hash = hashlib.sha256(file_bytes).hexdigest()
+
     mime_type, _ = mimetypes.guess_type(file_path)
     if not mime_type:
         mime_type = "application/octet-stream"
@@ -25,12 +121,15 @@ def save_document(file_id: str, file_path: str, user_email: str, document_type:
         file_data=file_bytes,
         mime_type=mime_type,
         document_type=document_type,
+        content_hash=content_hash,
         user_email=user_email,  # link document to the logged-in user
         **metadata
     )
 
     db.session.merge(doc)  # insert or update
     db.session.commit()
+    invalidate_document_metadata(file_id, user_email)
+    invalidate_user_answers(user_email)
 
     return doc.id
 
@@ -42,6 +141,37 @@ def get_document(file_id: str, user_email: str):
     return Document.query.filter_by(id=file_id, user_email=user_email).first()
 
 
+def get_documents_metadata_by_ids(file_ids, user_email: str):
+    """
+    Light metadata (file_name, mime_type, document_type) for several documents of a user,
+    fetched in one query without file_data and cached per process.
+    Returns {document_id: metadata}; unknown ids are left out.
+    """
+    found = {}
+    missing = []
+    with _metadata_lock:
+        for file_id in set(file_ids):
+            cached = _metadata_cache.get((user_email, file_id))
+            if cached is not None:
+                found[file_id] = cached
+            else:
+                missing.append(file_id)
+
+    if missing:
+        rows = Document.query.filter(
+            Document.user_email == user_email,
+            Document.id.in_(missing)
+        ).with_entities(Document.id, Document.file_name, Document.mime_type, Document.document_type).all()
+
+        with _metadata_lock:
+            for file_id, file_name, mime_type, document_type in rows:
+                metadata = {"file_name": file_name, "mime_type": mime_type, "document_type": document_type}
+                _metadata_cache[(user_email, file_id)] = metadata
+                found[file_id] = metadata
+
+    return found
+
+
 def get_all_documents_for_user(user_email: str):
     """
     Retrieve all documents belonging to a given user.
@@ -49,6 +179,17 @@ def get_all_documents_for_user(user_email: str):
     docs = Document.query.filter_by(user_email=user_email).with_entities(Document.file_data).all()
     return [file_data for (file_data,) in docs]
 
+def get_document_ids_by_filenames(filenames, user_email: str):
+    """
+    Map file names to document ids for a user through the (user_email, file_name) index,
+    without loading file_data.
+    """
+    rows = Document.query.filter(
+        Document.user_email == user_email,
+        Document.file_name.in_(list(filenames))
+    ).with_entities(Document.file_name, Document.id).all()
+    return {file_name: doc_id for file_name, doc_id in rows}
+
 def get_all_documents_metadata(user_email: str):
     """
     Retrieve metadata for all documents belonging to a given user (without file_data).
@@ -58,12 +199,23 @@ def get_all_documents_metadata(user_email: str):
 
 def delete_document(file_id: str, user_email: str):
     """
-    Delete a document belonging to a given user.
+    Delete a document belonging to a given user, along with its chunks in the
+    vector store and the BM25 index.
     Returns True if deleted, False if not found.
     """
     doc = Document.query.filter_by(id=file_id, user_email=user_email).first()
     if doc:
         db.session.delete(doc)
         db.session.commit()
+        invalidate_document_metadata(file_id, user_email)
+        invalidate_user_answers(user_email)
+
+        # The row is the source of truth: chunks left behind by a failure here are
+        # orphans that the maintenance job removes on its next run
+        for delete_chunks in (delete_document_vectors, delete_document_sparse):
+            try:
+                delete_chunks(file_id, user_email)
+            except Exception as e:
+                print(f"WARNING: could not delete chunks of document {file_id} ({delete_chunks.__name__}): {e}")
         return True
     return False
@@ -0,0 +1,176 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from cachetools import LRUCache
+from ..config import Config
+
+# Hit/miss counters for this process
+_stats = {
+    "query_hits": 0, "query_misses": 0,
+    "chunk_hits": 0, "chunk_misses": 0, "chunk_evictions": 0
+}
+_lock = threading.Lock()
+_query_cache = LRUCache(maxsize=max(1, Config.QUERY_EMBEDDING_CACHE_SIZE))
+_initialized = False
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_BATCH = 500
+
+# Chunk vectors are stored as float16 to halve the footprint. The storage format is part
+# of the key, so entries written in another format are never read back (they age out
+# through the LRU eviction) and no worker has to drop a table other workers are using.
+_CHUNK_DTYPE = np.float16
+_CHUNK_FORMAT = "f16"
+
+
+def cache_namespace() -> str:
+    """
+    Vectors from different models or backends are not interchangeable.
+    """
+    backend = Config.EMBEDDING_BACKEND
+    if backend == "onnx" and Config.ONNX_QUANTIZE:
+        backend = "onnx-int8"
+    return f"{Config.EMBEDDING_MODEL_NAME}:{backend}"
+
+
+def _chunk_namespace() -> str:
+    return f"{cache_namespace()}:{_CHUNK_FORMAT}"
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def get_cached_query(query: str):
+    # QUERY_EMBEDDING_CACHE_SIZE=0 turns the query cache off
+    if Config.QUERY_EMBEDDING_CACHE_SIZE <= 0:
+        return None
+    with _lock:
+        vector = _query_cache.get((cache_namespace(), query))
+        _stats["query_hits" if vector is not None else "query_misses"] += 1
+    return vector
+
+
+def set_cached_query(query: str, vector):
+    if Config.QUERY_EMBEDDING_CACHE_SIZE <= 0:
+        return
+    with _lock:
+        _query_cache[(cache_namespace(), query)] = vector
+
+
+def _connect():
+    global _initialized
+    if not _initialized:
+        os.makedirs(os.path.dirname(Config.EMBEDDING_CACHE_PATH), exist_ok=True)
+    conn = sqlite3.connect(Config.EMBEDDING_CACHE_PATH, timeout=30)
+    if not _initialized:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_vectors ("
+            "namespace TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+            "size INTEGER NOT NULL, last_access REAL NOT NULL, PRIMARY KEY (namespace, text_hash))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_chunk_vectors_last_access ON chunk_vectors (last_access)")
+        conn.commit()
+        _initialized = True
+    return conn
+
+
+def get_cached_chunk_embeddings(hashes):
+    """
+    Return {text_hash: float32 vector} for the hashes already embedded with the current model.
+    """
+    if not Config.EMBEDDING_CACHE_ENABLED or not hashes:
+        return {}
+
+    namespace = _chunk_namespace()
+    found = {}
+    unique = list(set(hashes))
+    conn = _connect()
+    try:
+        for start in range(0, len(unique), _LOOKUP_BATCH):
+            batch = unique[start:start + _LOOKUP_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT text_hash, vector FROM chunk_vectors WHERE namespace = ? AND text_hash IN ({placeholders})",
+                [namespace, *batch]
+            ).fetchall()
+            for h, blob in rows:
+                found[h] = np.frombuffer(blob, dtype=_CHUNK_DTYPE).astype(np.float32)
+            if rows:
+                conn.execute(
+                    f"UPDATE chunk_vectors SET last_access = ? WHERE namespace = ? AND text_hash IN ({placeholders})",
+                    [time.time(), namespace, *batch]
+                )
+        conn.commit()
+    finally:
+        conn.close()
+
+    with _lock:
+        _stats["chunk_hits"] += sum(1 for h in hashes if h in found)
+        _stats["chunk_misses"] += sum(1 for h in hashes if h not in found)
+    return found
+
+
+def set_cached_chunk_embeddings(hashes, vectors):
+    """
+    Store freshly computed chunk vectors and return them as a later hit will: rounded
+    through float16, so a text embeds the same whether or not it was cached.
+    """
+    if not Config.EMBEDDING_CACHE_ENABLED or not hashes:
+        return vectors
+
+    stored = np.asarray(vectors, dtype=_CHUNK_DTYPE)
+    namespace = _chunk_namespace()
+    now = time.time()
+    rows = []
+    for h, vector in zip(hashes, stored):
+        blob = vector.tobytes()
+        rows.append((namespace, h, blob, len(blob), now))
+    conn = _connect()
+    try:
+        conn.executemany(
+            "INSERT OR REPLACE INTO chunk_vectors (namespace, text_hash, vector, size, last_access) VALUES (?, ?, ?, ?, ?)",
+            rows
+        )
+        _evict(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    return stored.astype(np.float32)
+
+
+def _evict(conn):
+    # Least recently used vectors go first once the cache exceeds EMBEDDING_CACHE_MAX_BYTES
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM chunk_vectors").fetchone()[0]
+    if total <= Config.EMBEDDING_CACHE_MAX_BYTES:
+        return
+
+    to_free = total - Config.EMBEDDING_CACHE_MAX_BYTES
+    victims = []
+    for namespace, h, size in conn.execute("SELECT namespace, text_hash, size FROM chunk_vectors ORDER BY last_access ASC"):
+        victims.append((namespace, h))
+        to_free -= size
+        if to_free <= 0:
+            break
+
+    conn.executemany("DELETE FROM chunk_vectors WHERE namespace = ? AND text_hash = ?", victims)
+    with _lock:
+        _stats["chunk_evictions"] += len(victims)
+
+
+def get_embedding_cache_stats():
+    """
+    Hit rates of the query LRU and the persistent chunk cache for this process.
+    """
+    with _lock:
+        stats = dict(_stats)
+        stats["query_cache_entries"] = len(_query_cache)
+
+    query_lookups = stats["query_hits"] + stats["query_misses"]
+    chunk_lookups = stats["chunk_hits"] + stats["chunk_misses"]
+    stats["query_hit_rate"] = stats["query_hits"] / query_lookups if query_lookups else 0.0
+    stats["chunk_hit_rate"] = stats["chunk_hits"] / chunk_lookups if chunk_lookups else 0.0
+    return stats
@@ -0,0 +1,166 @@
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+from ..config import Config
+
+# Wire format (both directions are length-prefixed, network byte order):
+#   request : uint32 length + JSON {"texts": [...]}
+#   response: uint32 rows + uint32 dim + rows*dim float32
+#             or ERROR_ROWS + uint32 length + UTF-8 error message
+_HEADER = struct.Struct("!II")
+_LENGTH = struct.Struct("!I")
+ERROR_ROWS = 0xFFFFFFFF
+
+
+def _recv_exact(sock, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        part = sock.recv(size - len(data))
+        if not part:
+            raise ConnectionError("Embedding server connection closed")
+        data.extend(part)
+    return bytes(data)
+
+
+class MicroBatcher:
+    """
+    Collects texts from concurrent requests and encodes them together: a batch is sent
+    to the model when it reaches `max_batch` texts or `max_wait` seconds after its first request.
+    """
+
+    def __init__(self, encode, max_batch: int, max_wait: float):
+        self._encode = encode
+        self._max_batch = max_batch
+        self._max_wait = max_wait
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, name="embedding-batcher", daemon=True).start()
+
+    def submit(self, texts) -> Future:
+        future = Future()
+        self._queue.put((texts, future))
+        return future
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            count = len(items[0][0])
+            deadline = time.monotonic() + self._max_wait
+
+            while count < self._max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                items.append(item)
+                count += len(item[0])
+
+            texts = [text for item_texts, _ in items for text in item_texts]
+            try:
+                vectors = np.asarray(self._encode(texts), dtype=np.float32)
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+
+            offset = 0
+            for item_texts, future in items:
+                future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+
+class _EmbeddingRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        # One connection carries many requests from the same app worker thread
+        while True:
+            try:
+                (length,) = _LENGTH.unpack(_recv_exact(self.request, _LENGTH.size))
+                payload = json.loads(_recv_exact(self.request, length))
+            except ConnectionError:
+                return
+
+            try:
+                vectors = self.server.batcher.submit(payload["texts"]).result()
+                rows, dim = vectors.shape if vectors.size else (0, 0)
+                self.request.sendall(_HEADER.pack(rows, dim) + vectors.tobytes())
+            except Exception as e:
+                message = str(e).encode("utf-8")
+                self.request.sendall(_HEADER.pack(ERROR_ROWS, len(message)) + message)
+
+
+class _EmbeddingServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def serve(socket_path: str = None):
+    """
+    Load the embedding model once and serve it to every app worker on a Unix socket.
+    """
+    from .embedding_service import encode_local
+
+    socket_path = socket_path or Config.EMBEDDING_SERVER_SOCKET
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    # Warm the model before accepting connections
+    encode_local(["warmup"])
+
+    server = _EmbeddingServer(socket_path, _EmbeddingRequestHandler)
+    server.batcher = MicroBatcher(
+        encode_local,
+        max_batch=Config.EMBEDDING_SERVER_MAX_BATCH,
+        max_wait=Config.EMBEDDING_SERVER_MAX_WAIT_MS / 1000
+    )
+    print(f"Embedding server listening on {socket_path}")
+    server.serve_forever()
+
+
+_local = threading.local()
+
+
+def _get_connection():
+    sock = getattr(_local, "sock", None)
+    if sock is None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(Config.EMBEDDING_SERVER_SOCKET)
+        _local.sock = sock
+    return sock
+
+
+def encode_remote(texts):
+    """
+    Embed texts through the shared embedding server (one persistent connection per thread).
+    """
+    payload = json.dumps({"texts": list(texts)}).encode("utf-8")
+
+    for attempt in range(2):
+        sock = _get_connection()
+        try:
+            sock.sendall(_LENGTH.pack(len(payload)) + payload)
+            rows, dim = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+            break
+        except (ConnectionError, OSError):
+            # Server restarted: reconnect once
+            sock.close()
+            _local.sock = None
+            if attempt == 1:
+                raise
+
+    if rows == ERROR_ROWS:
+        raise RuntimeError(f"Embedding server error: {_recv_exact(sock, dim).decode('utf-8')}")
+
+    data = _recv_exact(sock, rows * dim * 4)
+    return np.frombuffer(data, dtype=np.float32).reshape(rows, dim)
+
+
+if __name__ == "__main__":
+    serve()
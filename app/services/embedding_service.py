@@ -1,9 +1,80 @@
-from sentence_transformers import SentenceTransformer
+import threading
+from ..config import Config
+from .embedding_cache_service import (
+    text_hash, get_cached_query, set_cached_query,
+    get_cached_chunk_embeddings, set_cached_chunk_embeddings
+)
 
-model = SentenceTransformer("sentence-transformers/all-mpnet-base-v2", device='cpu')
+model = None
+_model_lock = threading.Lock()
+
+def get_model():
+    """
+    SentenceTransformer used by the "torch" backend, loaded on first use.
+    """
+    global model
+    with _model_lock:
+        if model is None:
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(Config.EMBEDDING_MODEL_NAME, device='cpu')
+            if Config.EMBEDDING_THREADS:
+                import torch
+                torch.set_num_threads(Config.EMBEDDING_THREADS)
+    return model
+
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+def get_tokenizer():
+    """
+    Tokenizer of the embedding model, loaded on its own (no model weights) so chunk
+    lengths can be measured in the word-pieces the model actually sees.
+    """
+    global _tokenizer
+    with _tokenizer_lock:
+        if _tokenizer is None:
+            from transformers import AutoTokenizer
+            _tokenizer = AutoTokenizer.from_pretrained(Config.EMBEDDING_MODEL_NAME)
+    return _tokenizer
+
+def encode_local(texts):
+    """
+    Embed texts in this process with the configured backend.
+    """
+    if Config.EMBEDDING_BACKEND == "onnx":
+        from .onnx_embedding_service import encode_onnx
+        return encode_onnx(texts)
+    # SentenceTransformer already sorts inputs by length before batching
+    return get_model().encode(texts, batch_size=Config.EMBEDDING_BATCH_SIZE)
+
+def _encode(texts):
+    if Config.EMBEDDING_SERVER_SOCKET:
+        from .embedding_server import encode_remote
+        return encode_remote(texts)
+    return encode_local(texts)
 
 def embed_texts(texts):
-    return model.encode(texts).tolist()
+    """
+    Embed chunk texts, reusing vectors already computed for identical text.
+    """
+    hashes = [text_hash(text) for text in texts]
+    cached = get_cached_chunk_embeddings(hashes)
+
+    # Only texts never embedded before go through the model (duplicates once)
+    missing = {}
+    for text, h in zip(texts, hashes):
+        if h not in cached and h not in missing:
+            missing[h] = text
+
+    if missing:
+        vectors = set_cached_chunk_embeddings(list(missing.keys()), _encode(list(missing.values())))
+        cached.update(zip(missing.keys(), vectors))
+
+    return [[float(x) for x in cached[h]] for h in hashes]
 
 def embed_query(query: str):
-    return model.encode([query]).tolist()
\ No newline at end of file
+    vector = get_cached_query(query)
+    if vector is None:
+        vector = _encode([query]).tolist()[0]
+        set_cached_query(query, vector)
+    return [list(vector)]
@@ -0,0 +1,177 @@
+import os
+import shutil
+import uuid
+import traceback
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from ..models.ingestion_job import IngestionJob, IngestionFile
+from ..extentions import db
+from ..config import Config
+from .treatment_pipeline_service import process_document_pipeline
+
+# Bounded pool shared by every upload handled by this process
+_executor = ThreadPoolExecutor(max_workers=Config.INGEST_WORKERS, thread_name_prefix="ingest")
+
+INTERRUPTED_ERROR = "Interrupted by a server restart, please upload the file again"
+
+
+def _process_id(pid: int):
+    """
+    "pid:start time" of a running process, or None. The start time tells a reused pid apart.
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Fields after the command name (which may contain spaces); starttime is field 22
+    return f"{pid}:{stat.rsplit(')', 1)[1].split()[19]}"
+
+
+def create_ingestion_job(files, user_email: str, document_url: str = "", pipeline_options: dict = None):
+    """
+    Save the uploaded files to disk, record a job with one entry per file and
+    queue each file on the worker pool. Returns the job right away.
+    `pipeline_options` are forwarded to process_document_pipeline (mode, parser_mode).
+    """
+    job_id = str(uuid.uuid4())
+    job_dir = os.path.join(Config.INGEST_UPLOAD_DIR, job_id)
+    os.makedirs(job_dir, exist_ok=True)
+
+    # Files only run on this process's pool: record it so a restart can find orphaned jobs
+    job = IngestionJob(id=job_id, user_email=user_email, status="queued", worker=_process_id(os.getpid()))
+    db.session.add(job)
+
+    queued = []
+    for file in files:
+        filename = os.path.basename(file.filename)
+        job_file = IngestionFile(job_id=job_id, filename=filename)
+        db.session.add(job_file)
+        db.session.flush()
+
+        # One directory per file so same-named files do not overwrite each other;
+        # the original name is kept since save_document derives file_name from the path
+        file_dir = os.path.join(job_dir, str(job_file.id))
+        os.makedirs(file_dir, exist_ok=True)
+        file_path = os.path.join(file_dir, filename)
+        file.save(file_path)
+        queued.append((job_file, file_path))
+
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    for job_file, file_path in queued:
+        _executor.submit(_run_file, app, job_id, job_file.id, file_path, user_email, document_url, pipeline_options or {})
+
+    return job
+
+
+def _update_file(file_id: int, **fields):
+    fields["updated_at"] = datetime.utcnow()
+    IngestionFile.query.filter_by(id=file_id).update(fields)
+    db.session.commit()
+
+
+def _finish_job_if_complete(job_id: str):
+    job = IngestionJob.query.get(job_id)
+    statuses = [f.status for f in job.files]
+    if any(s in ("queued", "running") for s in statuses):
+        return
+
+    job.status = "failed" if all(s == "failed" for s in statuses) else "done"
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+    shutil.rmtree(os.path.join(Config.INGEST_UPLOAD_DIR, job_id), ignore_errors=True)
+
+
+def _run_file(app, job_id: str, file_id: int, file_path: str, user_email: str, document_url: str, pipeline_options: dict):
+    """
+    Worker entry point: runs the full pipeline for one file inside an app context
+    and records stage, progress and errors as it goes.
+    """
+    with app.app_context():
+        def on_stage(stage, progress):
+            _update_file(file_id, stage=stage, progress=progress)
+
+        try:
+            # Inside the try: if this write fails too, the file is still marked failed
+            IngestionJob.query.filter_by(id=job_id, status="queued").update({"status": "running"})
+            _update_file(file_id, status="running", started_at=datetime.utcnow())
+            document_id = process_document_pipeline(
+                file_path,
+                document_url=document_url,
+                user_email=user_email,
+                on_stage=on_stage,
+                **pipeline_options
+            )
+            _update_file(file_id, status="done", progress=1.0, document_id=document_id, finished_at=datetime.utcnow())
+        except Exception as e:
+            db.session.rollback()
+            print(traceback.format_exc())
+            _update_file(file_id, status="failed", error=str(e), finished_at=datetime.utcnow())
+        finally:
+            _finish_job_if_complete(job_id)
+            db.session.remove()
+
+
+def _is_interrupted(job, stale_before: datetime) -> bool:
+    if job.worker and _process_id(os.getpid()) is not None:
+        return _process_id(int(job.worker.split(":")[0])) != job.worker
+    # Owner unknown (no /proc): a live sibling worker may own the job, so only give up
+    # on it once it has made no progress for INGEST_STALE_SECONDS
+    last_activity = max([job.created_at] + [f.updated_at for f in job.files if f.updated_at])
+    return last_activity < stale_before
+
+
+def fail_interrupted_jobs():
+    """
+    Mark the unfinished files of jobs whose process is gone (restart, crash), or that
+    stopped making progress when that process cannot be identified, as failed so
+    clients polling them stop waiting. Runs at startup; returns the number of jobs.
+    """
+    now = datetime.utcnow()
+    jobs = IngestionJob.query.filter(IngestionJob.status.in_(("queued", "running"))).all()
+    stale = [job for job in jobs if _is_interrupted(job, now - timedelta(seconds=Config.INGEST_STALE_SECONDS))]
+    for job in stale:
+        for job_file in job.files:
+            if job_file.status in ("queued", "running"):
+                job_file.status = "failed"
+                job_file.error = INTERRUPTED_ERROR
+                job_file.finished_at = now
+        job.status = "failed" if all(f.status == "failed" for f in job.files) else "done"
+        job.finished_at = now
+        shutil.rmtree(os.path.join(Config.INGEST_UPLOAD_DIR, job.id), ignore_errors=True)
+    db.session.commit()
+    return len(stale)
+
+
+def get_ingestion_job(job_id: str, user_email: str):
+    """
+    Retrieve an ingestion job belonging to a given user.
+    """
+    return IngestionJob.query.filter_by(id=job_id, user_email=user_email).first()
+
+
+def serialize_ingestion_job(job):
+    files = [{
+        "id": f.id,
+        "filename": f.filename,
+        "status": f.status,
+        "stage": f.stage,
+        "progress": f.progress,
+        "document_id": f.document_id,
+        "error": f.error,
+        "started_at": f.started_at.isoformat() if f.started_at else None,
+        "finished_at": f.finished_at.isoformat() if f.finished_at else None
+    } for f in job.files]
+
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "created_at": job.created_at.isoformat(),
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "progress": sum(f["progress"] for f in files) / len(files) if files else 1.0,
+        "files": files
+    }
@@ -1,22 +1,125 @@
 from langchain_google_genai import ChatGoogleGenerativeAI
+from cachetools import LRUCache
 from decouple import config
+from ..config import Config
+import hashlib
+import threading
 import os
 
 DEFAULT_MODEL = "models/gemini-2.5-flash"
 
+# LLM clients and chains reused across requests, keyed by (kind, model, API key hash, ...).
+# Clients hold their own gRPC channel, so reusing them also reuses the connection.
+_pool = LRUCache(maxsize=Config.LLM_POOL_SIZE)
+_pool_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+# google.generativeai keeps its API key in module state
+_genai_lock = threading.Lock()
+
+
 def get_default_api_key():
     """Lazy load the API key to allow app startup without it"""
     return os.getenv("GEMINI_API_KEY") or config("GEMINI_API_KEY", default=None)
 
-def get_user_llm(llm_model=None, api_key=None, temperature=0.2):
-    model_name = llm_model or DEFAULT_MODEL
+
+def _resolve_key(api_key):
     key = api_key or get_default_api_key()
-    
     if not key:
         raise ValueError("GEMINI_API_KEY not provided. Please set the GEMINI_API_KEY environment variable or provide an api_key parameter.")
+    return key
+
+
+def api_key_hash(api_key: str) -> str:
+    # Pool keys never hold the API key itself
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
 
-    return ChatGoogleGenerativeAI(
-        model=model_name,
-        google_api_key=key,
-        temperature=temperature
+
+def resolve_api_key_hash(api_key=None) -> str:
+    """
+    Hash of the key a call will actually use (the user's or the default one), for rate limiting.
+    """
+    return api_key_hash(_resolve_key(api_key))
+
+
+def _pooled(key, build):
+    with _pool_lock:
+        value = _pool.get(key)
+        if value is not None:
+            _stats["hits"] += 1
+            return value
+        _stats["misses"] += 1
+
+    value = build()
+    with _pool_lock:
+        # Another thread may have built the same entry meanwhile; keep the first one
+        return _pool.setdefault(key, value)
+
+
+def get_user_llm(llm_model=None, api_key=None, temperature=0.2):
+    model_name = llm_model or DEFAULT_MODEL
+    key = _resolve_key(api_key)
+
+    return _pooled(
+        ("chat", model_name, api_key_hash(key), temperature),
+        lambda: ChatGoogleGenerativeAI(
+            model=model_name,
+            google_api_key=key,
+            temperature=temperature,
+            # Retries are done by rate_limit_service, which also throttles the key
+            max_retries=1
+        )
+    )
+
+
+def get_qa_chain(prompt, llm_model=None, api_key=None):
+    """
+    "stuff" question-answering chain over the pooled client for these settings.
+    Chains hold no per-call state, so one instance serves concurrent requests.
+    """
+    from langchain.chains.question_answering import load_qa_chain
+
+    model_name = llm_model or DEFAULT_MODEL
+    key = _resolve_key(api_key)
+
+    return _pooled(
+        ("qa_chain", model_name, api_key_hash(key), id(prompt)),
+        lambda: load_qa_chain(get_user_llm(model_name, key), chain_type="stuff", prompt=prompt)
     )
+
+
+def get_genai_model(llm_model=None, api_key=None):
+    """
+    google.generativeai model used by the parsing service, pooled like the chat clients.
+    """
+    import google.generativeai as genai
+    from google.generativeai import client as genai_client
+
+    model_name = llm_model or DEFAULT_MODEL
+    key = _resolve_key(api_key)
+
+    def build():
+        # genai.configure sets a process-wide key; bind the model to a client for this key
+        # right away so a later configure() for another user does not change it.
+        # google.generativeai has no public per-model key or client argument, so this sets
+        # GenerativeModel._client, which depends on its internals: keep google-generativeai
+        # pinned in requirements.txt and check this line when upgrading it.
+        with _genai_lock:
+            genai.configure(api_key=key)
+            model = genai.GenerativeModel(model_name)
+            model._client = genai_client.get_default_generative_client()
+        # Lets callers rate-limit by key without holding the key itself
+        model.api_key_hash = api_key_hash(key)
+        return model
+
+    return _pooled(("genai", model_name, api_key_hash(key)), build)
+
+
+def get_llm_pool_stats():
+    with _pool_lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "entries": len(_pool),
+            "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else None
+        }
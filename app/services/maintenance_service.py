@@ -0,0 +1,211 @@
+import argparse
+import fcntl
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from ..models.document import Document
+from ..models.ingestion_job import IngestionJob
+from ..models.user import User
+from ..extentions import db
+from ..config import Config
+from .vectorstore_service import count_chunks_by_document, delete_document_vectors, compact_vectorstore
+from .sparse_index_service import count_sparse_chunks_by_document, delete_document_sparse, compact_sparse_index
+from .answer_cache_service import invalidate_user_answers
+
+
+def _has_active_ingestion(user_email: str) -> bool:
+    # The streaming pipeline writes chunks before the Document row, so a user's chunks
+    # can only be judged while nothing of theirs is being ingested. Jobs older than the
+    # grace period are assumed to belong to a worker that died.
+    since = datetime.utcnow() - timedelta(seconds=Config.MAINTENANCE_INGEST_GRACE_SECONDS)
+    return db.session.query(
+        IngestionJob.query.filter(
+            IngestionJob.user_email == user_email,
+            IngestionJob.status.in_(("queued", "running")),
+            IngestionJob.created_at >= since
+        ).exists()
+    ).scalar()
+
+
+def _block_ingestion_writes(user_email: str):
+    # A write statement takes SQLite's write lock for the rest of the transaction (even
+    # when it matches no row): no ingestion job can be queued and no Document row
+    # written until it ends. Held only around the re-check and delete of one document.
+    db.session.execute(
+        text("UPDATE ingestion_job SET status = status WHERE user_email = :user_email"),
+        {"user_email": user_email}
+    )
+
+
+def _delete_if_orphan(doc_id, user_email: str, vectors: bool, sparse: bool) -> bool:
+    """
+    Delete the chunks of `doc_id` if it is still an orphan: no Document row and no
+    ingestion in progress for the user. The check and the delete share one short
+    transaction so that no ingestion can start in between.
+    """
+    try:
+        _block_ingestion_writes(user_email)
+        if _has_active_ingestion(user_email):
+            return False
+        if Document.query.filter_by(id=doc_id, user_email=user_email).first() is not None:
+            return False
+        if vectors:
+            delete_document_vectors(doc_id, user_email)
+        if sparse:
+            delete_document_sparse(doc_id, user_email)
+        return True
+    finally:
+        # Nothing was written to the database: this only releases the write lock
+        db.session.rollback()
+
+
+def maintain_user(user_email: str, dry_run: bool = False):
+    """
+    Find chunks whose doc_id has no Document row in the vector store and the BM25 index,
+    remove them and compact both indexes. With `dry_run`, only report.
+    """
+    report = {"user_email": user_email}
+    if _has_active_ingestion(user_email):
+        report["skipped"] = "ingestion in progress"
+        return report
+
+    # Scans run outside any write transaction; each orphan is re-checked before its delete
+    live_ids = {doc_id for (doc_id,) in Document.query.filter_by(user_email=user_email).with_entities(Document.id)}
+    db.session.rollback()
+    vector_counts = count_chunks_by_document(user_email)
+    sparse_counts = count_sparse_chunks_by_document(user_email)
+
+    vector_orphans = {doc_id: n for doc_id, n in vector_counts.items() if doc_id not in live_ids}
+    sparse_orphans = {doc_id: n for doc_id, n in sparse_counts.items() if doc_id not in live_ids}
+    report.update({
+        "live_documents": len(live_ids),
+        "vector_chunks": sum(vector_counts.values()),
+        "orphan_vector_chunks": sum(vector_orphans.values()),
+        "sparse_chunks": sum(sparse_counts.values()),
+        "orphan_sparse_chunks": sum(sparse_orphans.values()),
+        "orphan_documents": sorted(str(doc_id) for doc_id in set(vector_orphans) | set(sparse_orphans))
+    })
+    if dry_run:
+        return report
+
+    deleted = 0
+    # Chunks without a doc_id cannot be matched by a where filter; leave them reported
+    for doc_id in (set(vector_orphans) | set(sparse_orphans)) - {None}:
+        if _delete_if_orphan(doc_id, user_email, doc_id in vector_orphans, doc_id in sparse_orphans):
+            deleted += 1
+        elif _has_active_ingestion(user_email):
+            report["skipped"] = "ingestion started during maintenance"
+            break
+    report["orphan_documents_deleted"] = deleted
+
+    if deleted:
+        invalidate_user_answers(user_email)
+
+    report["vector_rows_reclaimed"] = compact_vectorstore(user_email)
+    report["sparse_bytes_reclaimed"] = compact_sparse_index(user_email)
+    return report
+
+
+def vacuum_database():
+    """
+    VACUUM the application database when deletes have left free pages (document blobs).
+    Returns the number of free pages released.
+    """
+    if db.engine.dialect.name != "sqlite":
+        return 0
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        free_pages = conn.execute(text("PRAGMA freelist_count")).scalar()
+        if free_pages:
+            conn.execute(text("VACUUM"))
+    return free_pages
+
+
+def run_maintenance(user_emails=None, dry_run: bool = False):
+    """
+    Maintenance pass over the given users (every user by default), followed by a
+    VACUUM of the application database. Must run inside an app context.
+    """
+    start = time.perf_counter()
+    if user_emails is None:
+        user_emails = [email for (email,) in User.query.with_entities(User.email)]
+
+    users = []
+    for user_email in user_emails:
+        try:
+            users.append(maintain_user(user_email, dry_run=dry_run))
+        except Exception as e:
+            users.append({"user_email": user_email, "error": str(e)})
+
+    report = {"dry_run": dry_run, "users": users}
+    if not dry_run:
+        report["database_pages_reclaimed"] = vacuum_database()
+    report["duration_s"] = round(time.perf_counter() - start, 3)
+    return report
+
+
+def _maintenance_loop(app, interval: float):
+    lock_path = os.path.join(Config.MAINTENANCE_LOCK_DIR, "maintenance.lock")
+    os.makedirs(Config.MAINTENANCE_LOCK_DIR, exist_ok=True)
+    while True:
+        time.sleep(interval)
+        # Every gunicorn worker runs this loop: the lock file holds the time of the last
+        # pass so that only one worker per interval does the work
+        with open(lock_path, "a+") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue
+            lock_file.seek(0)
+            last_run = lock_file.read().strip()
+            if last_run and time.time() - float(last_run) < interval * 0.9:
+                continue
+
+            with app.app_context():
+                try:
+                    report = run_maintenance()
+                    print(f"Maintenance pass done in {report['duration_s']}s")
+                except Exception as e:
+                    print(f"WARNING: maintenance pass failed: {e}")
+                finally:
+                    db.session.remove()
+
+            lock_file.seek(0)
+            lock_file.truncate()
+            lock_file.write(str(time.time()))
+
+
+def start_maintenance_scheduler(app, interval: float = None):
+    """
+    Run a maintenance pass every MAINTENANCE_INTERVAL_SECONDS in a daemon thread (0 disables it).
+    In preload mode the thread is started in each forked worker rather than in the master.
+    """
+    interval = Config.MAINTENANCE_INTERVAL_SECONDS if interval is None else interval
+    if interval <= 0:
+        return
+
+    def start():
+        threading.Thread(target=_maintenance_loop, args=(app, interval), name="maintenance", daemon=True).start()
+
+    if Config.STARTUP_MODE == "preload":
+        parent_pid = os.getpid()
+        os.register_at_fork(after_in_child=lambda: os.getppid() == parent_pid and start())
+    else:
+        start()
+
+
+if __name__ == "__main__":
+    import json
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description="Remove orphaned chunks and reclaim disk space")
+    parser.add_argument("--dry-run", action="store_true", help="only report orphans")
+    parser.add_argument("--user", action="append", help="limit the pass to these users")
+    args = parser.parse_args()
+
+    # No model is needed for maintenance
+    Config.STARTUP_MODE = "lazy"
+    Config.MAINTENANCE_INTERVAL_SECONDS = 0
+    with create_app().app_context():
+        print(json.dumps(run_maintenance(args.user, dry_run=args.dry_run), indent=2))
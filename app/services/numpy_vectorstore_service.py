@@ -0,0 +1,505 @@
+import fcntl
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+import numpy as np
+from ..config import Config
+
+# In-process vector index: one directory per user holding
+#   vectors.f32  - append-only float32 matrix (L2-normalized rows), memory-mapped for search
+#   rows.sqlite  - chunk id, text, metadata and a tombstone flag for each matrix row,
+#                  plus the vector dimension (meta table)
+#   index.hnsw   - optional HNSW graph for large tenants (requires hnswlib)
+#   codes.i8 + scales.f32 / codes.bin - optional quantized copy used for the first pass
+#                  (NUMPY_QUANTIZATION), rebuilt from vectors.f32 whenever it is stale
+# Rows are never rewritten in place: deletes set a tombstone, compaction rewrites the files.
+# Several processes (gunicorn workers, the ASGI server, the maintenance CLI) may open the
+# same store: writes hold an exclusive flock on `lock`, reads a shared one, and every
+# locked operation first picks up the rows other processes appended. Deletes and
+# compaction bump a generation number (meta table) that makes the others reload.
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def _user_dir(user_email: str) -> str:
+    safe_name = user_email.replace("@", "_at_").replace(".", "_")
+    return os.path.join(Config.NUMPY_VECTOR_DIR, f"documents_{safe_name}")
+
+
+def _matches(metadata: dict, where: dict) -> bool:
+    """Evaluate the subset of Chroma `where` filters used by this app."""
+    if not where:
+        return True
+    if "$and" in where:
+        return all(_matches(metadata, clause) for clause in where["$and"])
+    if "$or" in where:
+        return any(_matches(metadata, clause) for clause in where["$or"])
+    for key, condition in where.items():
+        value = metadata.get(key)
+        if isinstance(condition, dict):
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+            if "$nin" in condition and value in condition["$nin"]:
+                return False
+            if "$eq" in condition and value != condition["$eq"]:
+                return False
+            if "$ne" in condition and value == condition["$ne"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+QUANTIZATION_MODES = ("none", "int8", "binary")
+
+# Number of set bits of every byte value, for Hamming distances over packed sign bits
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def quantize_int8(vectors: np.ndarray):
+    """
+    Symmetric per-row int8 codes: vector ~= codes * scale.
+    """
+    scales = np.clip(np.abs(vectors).max(axis=1), 1e-12, None) / 127.0
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def quantize_binary(vectors: np.ndarray) -> np.ndarray:
+    """
+    One sign bit per dimension, packed 8 per byte (dim / 8 bytes per vector).
+    """
+    return np.packbits(vectors > 0, axis=1)
+
+
+def _tmp_path(path: str) -> str:
+    # Unique per writer: readers holding only the shared lock may rebuild the same file at once
+    return f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+
+
+class NumpyVectorStore:
+    """
+    Exact (brute-force) or HNSW nearest-neighbour search over a memory-mapped matrix.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.hnsw_path = os.path.join(directory, "index.hnsw")
+        self.code_paths = {
+            "int8": (os.path.join(directory, "codes.i8"), os.path.join(directory, "scales.f32")),
+            "binary": (os.path.join(directory, "codes.bin"),)
+        }
+        self.lock = threading.RLock()
+        self._lock_path = os.path.join(directory, "lock")
+        self._lock_file = None
+        self._lock_depth = 0
+
+        self.db = sqlite3.connect(os.path.join(directory, "rows.sqlite"), check_same_thread=False, timeout=30)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS rows ("
+            "row INTEGER PRIMARY KEY, chunk_id TEXT NOT NULL, doc_id TEXT, text TEXT NOT NULL, "
+            "metadata TEXT NOT NULL, deleted INTEGER NOT NULL DEFAULT 0)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS ix_rows_doc_id ON rows (doc_id)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.db.commit()
+
+        self.dim = None
+        self._generation = None
+        self._load_rows()
+
+    @contextmanager
+    def locked(self, exclusive: bool = False):
+        """
+        Hold the store for this thread and, across processes, a shared (read) or exclusive
+        (write) flock. Re-entrant; the outermost call decides the lock mode.
+        """
+        with self.lock:
+            if self._lock_depth == 0:
+                self._lock_file = open(self._lock_path, "a+")
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            self._lock_depth += 1
+            try:
+                if self._lock_depth == 1:
+                    if self._meta("generation") != self._generation:
+                        # Tombstones or row numbers changed in another process
+                        self._load_rows()
+                    else:
+                        self._refresh()
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    self._lock_file.close()  # releases the flock
+                    self._lock_file = None
+
+    def _meta(self, key: str):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _bump_generation(self):
+        # Call inside the transaction that changes tombstones or row numbers
+        self._generation = str(int(self._meta("generation") or 0) + 1)
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('generation', ?)", (self._generation,))
+
+    def _load_rows(self):
+        self._generation = self._meta("generation")
+        self.chunk_ids = []
+        self.metadatas = []
+        self.alive = np.zeros(0, dtype=bool)
+        self._matrix = None
+        self._hnsw = None
+        self._codes = None
+        with self.locked(exclusive=True):
+            self._refresh()
+
+    def _refresh(self):
+        # Pick up rows appended by other processes since the last locked operation
+        rows = self.db.execute(
+            "SELECT row, chunk_id, metadata, deleted FROM rows WHERE row >= ? ORDER BY row", (len(self.chunk_ids),)
+        ).fetchall()
+        if not rows:
+            return
+        if self.dim is None:
+            dim = self._meta("dim")
+            if dim is None:
+                # Stores written before the dimension was recorded: every row has the same width
+                dim = os.path.getsize(self.vectors_path) // 4 // len(rows)
+                with self.db:
+                    self.db.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('dim', ?)", (str(dim),))
+            self.dim = int(dim)
+        self.chunk_ids.extend(chunk_id for _, chunk_id, _, _ in rows)
+        self.metadatas.extend(json.loads(metadata) for _, _, metadata, _ in rows)
+        self.alive = np.concatenate([self.alive, np.array([not deleted for _, _, _, deleted in rows], dtype=bool)])
+        self._matrix = None
+        self._codes = None
+        self._hnsw = None  # reloaded from disk and caught up on the next HNSW query
+
+    @property
+    def count(self) -> int:
+        return int(self.alive.sum())
+
+    def matrix(self):
+        if self._matrix is None and self.chunk_ids:
+            # The file may hold a torn tail from an interrupted write; only mapped rows count
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(len(self.chunk_ids), self.dim))
+        return self._matrix
+
+    def add(self, texts, ids, metadatas, embeddings):
+        vectors = np.array(embeddings, dtype=np.float32)
+        vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+        with self.locked(exclusive=True):
+            if self.dim is not None and vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the store ({self.dim})")
+
+            start = self.db.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM rows").fetchone()[0]
+            offset = start * vectors.shape[1] * 4
+            with open(self.vectors_path, "ab") as f:
+                # Drop anything past the last committed row, then append
+                f.truncate(offset)
+                f.write(vectors.tobytes())
+            try:
+                with self.db:
+                    self.db.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('dim', ?)", (str(vectors.shape[1]),))
+                    self.db.executemany(
+                        "INSERT INTO rows (row, chunk_id, doc_id, text, metadata) VALUES (?, ?, ?, ?, ?)",
+                        [
+                            (start + i, chunk_id, metadata.get("doc_id"), text, json.dumps(metadata))
+                            for i, (text, chunk_id, metadata) in enumerate(zip(texts, ids, metadatas))
+                        ]
+                    )
+            except Exception:
+                with open(self.vectors_path, "ab") as f:
+                    f.truncate(offset)
+                raise
+
+            self.dim = vectors.shape[1]
+            self.chunk_ids.extend(ids)
+            self.metadatas.extend(metadatas)
+            self.alive = np.concatenate([self.alive, np.ones(len(ids), dtype=bool)])
+            self._matrix = None
+            self._append_codes(vectors, start)
+            if self._hnsw is not None:
+                self._hnsw.resize_index(len(self.chunk_ids))
+                self._hnsw.add_items(vectors, np.arange(start, start + len(ids)))
+                self._save_hnsw(self._hnsw)
+            # Otherwise an index.hnsw on disk is caught up when it is next loaded
+
+    def delete(self, where: dict):
+        with self.locked(exclusive=True):
+            rows = [i for i, metadata in enumerate(self.metadatas) if self.alive[i] and _matches(metadata, where)]
+            if not rows:
+                return 0
+            with self.db:
+                self.db.executemany("UPDATE rows SET deleted = 1 WHERE row = ?", [(row,) for row in rows])
+                self._bump_generation()
+            self.alive[rows] = False
+            if self._hnsw is not None:
+                for row in rows:
+                    self._hnsw.mark_deleted(row)
+                self._save_hnsw(self._hnsw)
+            return len(rows)
+
+    def compact(self):
+        """
+        Rewrite the matrix and the row table without tombstoned rows and drop the HNSW
+        graph (rebuilt on the next large query). Returns the number of rows reclaimed.
+        """
+        with self.locked(exclusive=True):
+            dead = int((~self.alive).sum())
+            if not dead:
+                return 0
+
+            live = np.flatnonzero(self.alive)
+            matrix = self.matrix()
+            tmp_path = self.vectors_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                for start in range(0, len(live), 4096):
+                    f.write(np.asarray(matrix[live[start:start + 4096]]).tobytes())
+            self._matrix = None
+            self._hnsw = None
+
+            # Live rows keep their order, so renumbering in ascending order never collides
+            with self.db:
+                self.db.execute("DELETE FROM rows WHERE deleted = 1")
+                self.db.executemany(
+                    "UPDATE rows SET row = ? WHERE row = ?",
+                    [(new_row, int(old_row)) for new_row, old_row in enumerate(live)]
+                )
+                self._bump_generation()
+                os.replace(tmp_path, self.vectors_path)
+            self.db.execute("VACUUM")
+            for path in [self.hnsw_path, *(p for paths in self.code_paths.values() for p in paths)]:
+                if os.path.exists(path):
+                    os.remove(path)
+
+            self._load_rows()
+            return dead
+
+    def live_metadatas(self):
+        with self.locked():
+            return [metadata for metadata, alive in zip(self.metadatas, self.alive) if alive]
+
+    def disk_bytes(self) -> int:
+        return sum(
+            os.path.getsize(os.path.join(self.directory, name)) for name in os.listdir(self.directory)
+        )
+
+    def _append_codes(self, vectors, previous_rows: int):
+        # Extend the code files that are in use and up to date; stale ones are removed
+        # and rebuilt from the full-precision matrix on the next quantized query
+        for mode, paths in self.code_paths.items():
+            if not os.path.exists(paths[0]):
+                continue
+            row_bytes = vectors.shape[1] if mode == "int8" else (vectors.shape[1] + 7) // 8
+            if os.path.getsize(paths[0]) != previous_rows * row_bytes:
+                for path in paths:
+                    if os.path.exists(path):
+                        os.remove(path)
+                continue
+            if mode == "int8":
+                codes, scales = quantize_int8(vectors)
+                with open(paths[1], "ab") as f:
+                    f.write(scales.tobytes())
+            else:
+                codes = quantize_binary(vectors)
+            with open(paths[0], "ab") as f:
+                f.write(codes.tobytes())
+        self._codes = None
+
+    def codes(self, mode: str):
+        """
+        Quantized copy of the matrix held in memory: (mode, codes, scales or None).
+        Built from vectors.f32 (in blocks) when the files are missing or stale.
+        """
+        n = len(self.chunk_ids)
+        if self._codes is not None and self._codes[0] == mode and len(self._codes[1]) == n:
+            return self._codes
+
+        matrix = self.matrix()
+        dim = matrix.shape[1]
+        paths = self.code_paths[mode]
+        row_bytes = dim if mode == "int8" else (dim + 7) // 8
+
+        if not (os.path.exists(paths[0]) and os.path.getsize(paths[0]) == n * row_bytes):
+            # Readers only hold a shared lock: build under temporary names, then swap in
+            tmp_paths = [_tmp_path(path) for path in paths]
+            with open(tmp_paths[0], "wb") as code_file:
+                scale_file = open(tmp_paths[1], "wb") if mode == "int8" else None
+                try:
+                    for start in range(0, n, 65536):
+                        block = np.asarray(matrix[start:start + 65536])
+                        if mode == "int8":
+                            codes, scales = quantize_int8(block)
+                            scale_file.write(scales.tobytes())
+                        else:
+                            codes = quantize_binary(block)
+                        code_file.write(codes.tobytes())
+                finally:
+                    if scale_file:
+                        scale_file.close()
+            for tmp_path, path in reversed(list(zip(tmp_paths, paths))):
+                os.replace(tmp_path, path)
+
+        if mode == "int8":
+            codes = np.fromfile(paths[0], dtype=np.int8).reshape(n, dim)
+            scales = np.fromfile(paths[1], dtype=np.float32)
+        else:
+            codes = np.fromfile(paths[0], dtype=np.uint8).reshape(n, row_bytes)
+            scales = None
+        self._codes = (mode, codes, scales)
+        return self._codes
+
+    def _first_pass_scores(self, query_vector, mode: str):
+        _, codes, scales = self.codes(mode)
+        if mode == "int8":
+            scores = np.empty(len(codes), dtype=np.float32)
+            for start in range(0, len(codes), 65536):
+                block = codes[start:start + 65536]
+                scores[start:start + len(block)] = (block.astype(np.float32) @ query_vector) * scales[start:start + len(block)]
+            return scores
+
+        # Binary: fewer differing sign bits = closer
+        query_bits = quantize_binary(query_vector[None, :])[0]
+        return -_POPCOUNT[np.bitwise_xor(codes, query_bits)].sum(axis=1, dtype=np.int32).astype(np.float32)
+
+    def _get_hnsw(self):
+        try:
+            import hnswlib
+        except ImportError:
+            return None
+
+        if self._hnsw is None:
+            matrix = self.matrix()
+            n = len(self.chunk_ids)
+            index = hnswlib.Index(space="ip", dim=self.dim)
+            if os.path.exists(self.hnsw_path):
+                index.load_index(self.hnsw_path, max_elements=n)
+                indexed = index.get_current_count()
+            else:
+                index.init_index(max_elements=n, ef_construction=200, M=16)
+                indexed = 0
+            if indexed < n:
+                # Rows added while the graph was not loaded (or by another process)
+                index.add_items(np.asarray(matrix[indexed:]), np.arange(indexed, n))
+                for row in np.flatnonzero(~self.alive[indexed:]):
+                    index.mark_deleted(int(indexed + row))
+                self._save_hnsw(index)
+            index.set_ef(max(64, Config.NUMPY_HNSW_EF))
+            self._hnsw = index
+        return self._hnsw
+
+    def _save_hnsw(self, index):
+        tmp_path = _tmp_path(self.hnsw_path)
+        index.save_index(tmp_path)
+        os.replace(tmp_path, self.hnsw_path)
+
+    def query(self, query_embedding, k: int, where: dict = None):
+        """
+        Return (row indices, similarities) of the k nearest live rows matching `where`.
+        """
+        with self.locked():
+            if not self.count:
+                return [], []
+
+            query_vector = np.array(query_embedding, dtype=np.float32).reshape(-1)
+            query_vector /= max(np.linalg.norm(query_vector), 1e-12)
+
+            mask = self.alive.copy()
+            if where:
+                mask &= np.array([_matches(metadata, where) for metadata in self.metadatas], dtype=bool)
+            k = min(k, int(mask.sum()))
+            if k == 0:
+                return [], []
+
+            hnsw = self._get_hnsw() if self.count > Config.NUMPY_HNSW_THRESHOLD else None
+            if hnsw is not None:
+                allowed = mask
+                labels, distances = hnsw.knn_query(query_vector, k=k, filter=lambda label: bool(allowed[label]))
+                return labels[0].tolist(), (1.0 - distances[0]).tolist()
+
+            quantization = Config.NUMPY_QUANTIZATION
+            if quantization not in QUANTIZATION_MODES:
+                raise ValueError(f"NUMPY_QUANTIZATION must be one of {', '.join(QUANTIZATION_MODES)}")
+            if quantization != "none":
+                # First pass over the in-memory codes, then exact rescoring of a small
+                # candidate set read from the full-precision rows on disk
+                scores = self._first_pass_scores(query_vector, quantization)
+                scores[~mask] = -np.inf
+                candidates = min(int(mask.sum()), k * max(1, Config.NUMPY_RESCORE_FACTOR))
+                top = np.argpartition(-scores, candidates - 1)[:candidates]
+                top.sort()
+                exact = np.asarray(self.matrix()[top]) @ query_vector
+                order = np.argsort(-exact)[:k]
+                return top[order].tolist(), exact[order].tolist()
+
+            # Exact search: one matrix-vector product over the memory-mapped rows
+            scores = self.matrix() @ query_vector
+            scores[~mask] = -np.inf
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return top.tolist(), scores[top].tolist()
+
+    def rows(self, row_indices):
+        placeholders = ",".join("?" * len(row_indices))
+        found = {
+            row: (chunk_id, text, json.loads(metadata))
+            for row, chunk_id, text, metadata in self.db.execute(
+                f"SELECT row, chunk_id, text, metadata FROM rows WHERE row IN ({placeholders})", list(row_indices)
+            )
+        }
+        return [found[row] for row in row_indices]
+
+
+def get_store(user_email: str) -> NumpyVectorStore:
+    with _stores_lock:
+        store = _stores.get(user_email)
+        if store is None:
+            store = _stores[user_email] = NumpyVectorStore(_user_dir(user_email))
+    return store
+
+
+def add(texts, ids, metadatas, embeddings, user_email: str):
+    get_store(user_email).add(texts, ids, metadatas, embeddings)
+
+
+def query(query_embedding, user_email: str, k=5, where: dict = None):
+    """
+    Same shape as a Chroma query for a single embedding: ids, documents, metadatas, distances.
+    """
+    store = get_store(user_email)
+    # Same lock for the search and the row lookup, so a compaction cannot renumber in between
+    with store.locked():
+        rows, similarities = store.query(query_embedding[0] if np.ndim(query_embedding) == 2 else query_embedding, k, where)
+        found = store.rows(rows) if rows else []
+    return {
+        "ids": [[chunk_id for chunk_id, _, _ in found]],
+        "documents": [[text for _, text, _ in found]],
+        "metadatas": [[metadata for _, _, metadata in found]],
+        "distances": [[1.0 - s for s in similarities]]
+    }
+
+
+def delete(user_email: str, where: dict):
+    return get_store(user_email).delete(where)
+
+
+def get_all(user_email: str):
+    store = get_store(user_email)
+    rows = store.db.execute("SELECT chunk_id, text, metadata FROM rows WHERE deleted = 0 ORDER BY row").fetchall()
+    return {
+        "ids": [chunk_id for chunk_id, _, _ in rows],
+        "documents": [text for _, text, _ in rows],
+        "metadatas": [json.loads(metadata) for _, _, metadata in rows]
+    }
+
+
+def compact(user_email: str):
+    return get_store(user_email).compact()
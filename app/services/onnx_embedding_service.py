@@ -0,0 +1,177 @@
+import fcntl
+import os
+import threading
+import numpy as np
+import onnxruntime as ort
+from ..config import Config
+from .embedding_service import get_tokenizer
+
+_session = None
+_session_lock = threading.Lock()
+# Own tokenizer instance: fast tokenizers change their truncation settings on each call
+# that asks for different ones, and the shared instance is used without truncation by
+# chunking_service from ingestion threads ("Already borrowed" errors when mixed).
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+
+def _model_path(quantized: bool) -> str:
+    return os.path.join(Config.ONNX_MODEL_DIR, "model.int8.onnx" if quantized else "model.onnx")
+
+
+def export_onnx_model(quantize: bool = None) -> str:
+    """
+    Export the embedding transformer to ONNX (and optionally int8 dynamic quantization).
+    Pooling and normalization are done in NumPy, so only the encoder is exported.
+    Returns the path of the model the session should load.
+    """
+    quantize = Config.ONNX_QUANTIZE if quantize is None else quantize
+    os.makedirs(Config.ONNX_MODEL_DIR, exist_ok=True)
+    fp32_path = _model_path(quantized=False)
+    int8_path = _model_path(quantized=True)
+    if os.path.exists(int8_path if quantize else fp32_path):
+        return int8_path if quantize else fp32_path
+
+    # One export per host: other workers wait here, then find the finished files.
+    # Files are written under a temporary name so a crashed export is never loaded.
+    with open(os.path.join(Config.ONNX_MODEL_DIR, "export.lock"), "a+") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        _export_locked(fp32_path, int8_path, quantize)
+    return int8_path if quantize else fp32_path
+
+
+def _export_locked(fp32_path: str, int8_path: str, quantize: bool):
+    if not os.path.exists(fp32_path):
+        import torch
+        from transformers import AutoModel
+
+        hf_model = AutoModel.from_pretrained(Config.EMBEDDING_MODEL_NAME)
+        hf_model.eval()
+
+        class _Encoder(torch.nn.Module):
+            def __init__(self, encoder):
+                super().__init__()
+                self.encoder = encoder
+
+            def forward(self, input_ids, attention_mask):
+                return self.encoder(input_ids=input_ids, attention_mask=attention_mask, return_dict=False)[0]
+
+        dummy = get_tokenizer()(["export the embedding model"], return_tensors="pt")
+        # dynamo=False: the TorchScript exporter, since torch 2.9 defaults to the dynamo
+        # exporter, which needs onnxscript
+        torch.onnx.export(
+            _Encoder(hf_model),
+            (dummy["input_ids"], dummy["attention_mask"]),
+            fp32_path + ".tmp",
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"}
+            },
+            opset_version=17,
+            dynamo=False
+        )
+        os.replace(fp32_path + ".tmp", fp32_path)
+
+    if quantize and not os.path.exists(int8_path):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(fp32_path, int8_path + ".tmp", weight_type=QuantType.QInt8)
+        os.replace(int8_path + ".tmp", int8_path)
+
+
+def get_onnx_session():
+    """
+    ONNX Runtime session for the embedding model, exported on first use.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                options = ort.SessionOptions()
+                if Config.EMBEDDING_THREADS:
+                    options.intra_op_num_threads = Config.EMBEDDING_THREADS
+                options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                _session = ort.InferenceSession(export_onnx_model(), options, providers=["CPUExecutionProvider"])
+    return _session
+
+
+def _get_onnx_tokenizer():
+    global _tokenizer
+    with _tokenizer_lock:
+        if _tokenizer is None:
+            from transformers import AutoTokenizer
+            _tokenizer = AutoTokenizer.from_pretrained(Config.EMBEDDING_MODEL_NAME)
+    return _tokenizer
+
+
+def _mean_pool_normalize(last_hidden_state, attention_mask):
+    # Same pooling as all-mpnet-base-v2: masked mean, then L2 normalization
+    mask = attention_mask[..., None].astype(np.float32)
+    summed = (last_hidden_state * mask).sum(axis=1)
+    pooled = summed / np.clip(mask.sum(axis=1), 1e-9, None)
+    return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+
+def encode_onnx(texts, batch_size: int = None):
+    """
+    Embed texts with the ONNX model. Texts are sorted by token length and batched
+    so each batch is padded only to its own longest text; output keeps input order.
+    """
+    batch_size = batch_size or Config.EMBEDDING_BATCH_SIZE
+    session = get_onnx_session()
+    tokenizer = _get_onnx_tokenizer()
+
+    encoded = tokenizer(list(texts), truncation=True, max_length=Config.EMBEDDING_MAX_SEQ_LENGTH)
+    lengths = [len(ids) for ids in encoded["input_ids"]]
+    order = np.argsort(lengths, kind="stable")
+
+    embeddings = None
+    for start in range(0, len(order), batch_size):
+        batch_idx = order[start:start + batch_size]
+        width = max(lengths[i] for i in batch_idx)
+
+        input_ids = np.full((len(batch_idx), width), tokenizer.pad_token_id, dtype=np.int64)
+        attention_mask = np.zeros((len(batch_idx), width), dtype=np.int64)
+        for row, i in enumerate(batch_idx):
+            ids = encoded["input_ids"][i]
+            input_ids[row, :len(ids)] = ids
+            attention_mask[row, :len(ids)] = 1
+
+        last_hidden_state = session.run(None, {"input_ids": input_ids, "attention_mask": attention_mask})[0]
+        if embeddings is None:
+            embeddings = np.zeros((len(lengths), last_hidden_state.shape[-1]), dtype=np.float32)
+        embeddings[batch_idx] = _mean_pool_normalize(last_hidden_state, attention_mask)
+
+    return embeddings if embeddings is not None else np.zeros((0, 0), dtype=np.float32)
+
+
+def check_embedding_parity(texts):
+    """
+    Compare ONNX embeddings with the SentenceTransformer reference and report cosine drift.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    reference = SentenceTransformer(Config.EMBEDDING_MODEL_NAME, device="cpu").encode(texts, normalize_embeddings=True)
+    candidate = encode_onnx(texts)
+    cosines = (reference * candidate).sum(axis=1)
+
+    return {
+        "model_path": export_onnx_model(),
+        "num_texts": len(texts),
+        "mean_cosine": float(cosines.mean()),
+        "min_cosine": float(cosines.min()),
+        "max_drift": float(1.0 - cosines.min())
+    }
+
+
+if __name__ == "__main__":
+    sample_texts = [
+        "Invoice number INV-2024-0042 is due on March 3rd.",
+        "The candidate has five years of experience with Python and Flask.",
+        "Section 4.2 describes the warranty conditions for replacement parts.",
+        "Quelle est la date de livraison prévue pour la commande ?",
+        " ".join(["Long paragraph about retrieval augmented generation."] * 40),
+    ]
+    print(check_embedding_parity(sample_texts))
@@ -0,0 +1,122 @@
+import ast
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from ..config import Config
+
+# Hit/miss counters for this process
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+_lock = threading.Lock()
+_initialized = False
+
+
+def _connect():
+    global _initialized
+    if not _initialized:
+        os.makedirs(os.path.dirname(Config.PARSE_CACHE_PATH), exist_ok=True)
+    conn = sqlite3.connect(Config.PARSE_CACHE_PATH, timeout=30)
+    if not _initialized:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS parse_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_parse_cache_last_access ON parse_cache (last_access)")
+        conn.commit()
+        _initialized = True
+    return conn
+
+
+def make_cache_key(chunk: str, model_name: str, prompt_version: str) -> str:
+    """
+    Hash of the chunk text, the model and the prompt template version.
+    """
+    h = hashlib.sha256()
+    for part in (model_name, prompt_version, chunk):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def get_cached_parse(key: str):
+    """
+    Return the cached parsed dictionary for a key, or None.
+    """
+    if not Config.PARSE_CACHE_ENABLED:
+        return None
+
+    with _lock:
+        conn = _connect()
+        try:
+            row = conn.execute("SELECT value FROM parse_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                _stats["misses"] += 1
+                return None
+            conn.execute("UPDATE parse_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            _stats["hits"] += 1
+        finally:
+            conn.close()
+
+    # Stored with repr() so it round-trips through literal_eval like the LLM output
+    return ast.literal_eval(row[0])
+
+
+def set_cached_parse(key: str, parsed_dict: dict):
+    """
+    Store a parsed dictionary and evict least recently used entries above the size limit.
+    """
+    if not Config.PARSE_CACHE_ENABLED:
+        return
+
+    value = repr(parsed_dict)
+    with _lock:
+        conn = _connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO parse_cache (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time())
+            )
+            _evict(conn)
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def _evict(conn):
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM parse_cache").fetchone()[0]
+    if total <= Config.PARSE_CACHE_MAX_BYTES:
+        return
+
+    to_free = total - Config.PARSE_CACHE_MAX_BYTES
+    victims = []
+    for key, size in conn.execute("SELECT key, size FROM parse_cache ORDER BY last_access ASC"):
+        victims.append((key,))
+        to_free -= size
+        if to_free <= 0:
+            break
+
+    conn.executemany("DELETE FROM parse_cache WHERE key = ?", victims)
+    _stats["evictions"] += len(victims)
+
+
+def get_parse_cache_stats():
+    """
+    Hit/miss counters for this process plus current cache size.
+    """
+    with _lock:
+        conn = _connect()
+        try:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM parse_cache").fetchone()
+        finally:
+            conn.close()
+        stats = dict(_stats)
+
+    lookups = stats["hits"] + stats["misses"]
+    return {
+        **stats,
+        "hit_rate": stats["hits"] / lookups if lookups else 0.0,
+        "entries": entries,
+        "size_bytes": size
+    }
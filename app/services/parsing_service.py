@@ -1,79 +1,76 @@
-import google.generativeai as genai
 import re, ast
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from decouple import config
 from ..services.user_service import Get_user_llm
 from flask_jwt_extended import get_jwt_identity
+from ..config import Config
+from .parse_cache_service import make_cache_key, get_cached_parse, set_cached_parse
+from .llm_service import get_genai_model
+from .rate_limit_service import call_with_backoff, BULK
 
 DEFAULT_MODEL = "models/gemini-2.5-flash"
 
+# Bump whenever PARSE_PROMPT_TEMPLATE changes so cached parses are not reused
+PARSE_PROMPT_VERSION = "1"
+
 def get_default_api_key():
     """Lazy load the API key to allow app startup without it"""
     return os.getenv("GEMINI_API_KEY") or config("GEMINI_API_KEY", default=None)
 
 
 def split_text_smartly(raw_text: str, max_tokens=3000):
-    
+    """
+    Group heading-delimited sections (then paragraphs, for oversized sections) into
+    chunks of at most `max_tokens` words. Word counts are kept as running totals so
+    the split is linear in the text length.
+    """
     sections = re.split(r'\n(?=[A-Z\s]{3,}:)', raw_text)
     chunks = []
-    current_chunk = ""
+    current_parts = []
+    current_tokens = 0
+
+    def flush():
+        nonlocal current_parts, current_tokens
+        if current_parts:
+            chunks.append("\n\n".join(current_parts))
+        current_parts = []
+        current_tokens = 0
 
     for section in sections:
         section = section.strip()
         if not section:
             continue
         section_tokens = len(section.split())
-        current_tokens = len(current_chunk.split())
 
         if current_tokens + section_tokens <= max_tokens:
-            current_chunk += "\n\n" + section if current_chunk else section
-        else:
-            if current_chunk:
-                chunks.append(current_chunk)
-            if section_tokens > max_tokens:
-                paragraphs = re.split(r'\n\s*\n', section)
-                for para in paragraphs:
-                    para = para.strip()
-                    if not para:
-                        continue
-                    para_tokens = len(para.split())
-                    if len(current_chunk.split()) + para_tokens <= max_tokens:
-                        current_chunk += "\n\n" + para if current_chunk else para
-                    else:
-                        if current_chunk:
-                            chunks.append(current_chunk)
-                        current_chunk = para
-            else:
-                current_chunk = section
-
-    if current_chunk:
-        chunks.append(current_chunk)
-
-    return chunks
+            current_parts.append(section)
+            current_tokens += section_tokens
+            continue
 
+        flush()
+        if section_tokens <= max_tokens:
+            current_parts.append(section)
+            current_tokens = section_tokens
+            continue
 
-def order_document_into_dictionary_LLM(raw_text: str, max_tokens=3000):
+        paragraphs = re.split(r'\n\s*\n', section)
+        for para in paragraphs:
+            para = para.strip()
+            if not para:
+                continue
+            para_tokens = len(para.split())
+            if current_tokens + para_tokens > max_tokens:
+                flush()
+            current_parts.append(para)
+            current_tokens += para_tokens
 
-    current_user = str(get_jwt_identity())
-    user_settings = Get_user_llm(current_user)
+    flush()
 
-    api_key = user_settings.get("api_key") if user_settings else None
-    llm_model = user_settings.get("llm_model") if user_settings else None
+    return chunks
 
-    api_key_to_use = api_key or get_default_api_key()
-    if not api_key_to_use:
-        raise ValueError("GEMINI_API_KEY not provided. Please set the GEMINI_API_KEY environment variable or configure it in user settings.")
-    
-    genai.configure(api_key=api_key_to_use)
-    model = genai.GenerativeModel(llm_model or DEFAULT_MODEL)
 
-    all_chunks = split_text_smartly(raw_text, max_tokens=max_tokens)
-    combined_content = []
-    final_metadata = {}
-    document_type = "generic"
-
-    for chunk in all_chunks:
-        prompt = f"""
+PARSE_PROMPT_TEMPLATE = """
         You are a **universal document parser**. Analyze the provided unstructured text and convert it into a **RAG-compliant Python dictionary** for semantic search and retrieval.
 
         Your output must be a single valid **Python dictionary** (not JSON) following this schema:
@@ -90,19 +87,109 @@ def order_document_into_dictionary_LLM(raw_text: str, max_tokens=3000):
         {chunk}
         """
 
-        response = model.generate_content(prompt)
 
-        text = re.sub(r"^```(?:python)?\s*", "", response.text.strip(), flags=re.IGNORECASE)
-        text = re.sub(r"\s*```$", "", text)
+def parse_llm_response(response_text: str) -> dict:
+    """
+    Strip markdown fences / variable assignment from the LLM answer and evaluate the dictionary.
+    """
+    text = re.sub(r"^```(?:python)?\s*", "", response_text.strip(), flags=re.IGNORECASE)
+    text = re.sub(r"\s*```$", "", text)
+
+    match = re.match(r'^\s*\w+\s*=\s*(\{.*\})\s*$', text, re.DOTALL)
+    if match:
+        text = match.group(1)
+
+    return ast.literal_eval(text.strip())
+
+
+def parse_chunk_LLM(model, chunk: str, max_retries=None) -> dict:
+    """
+    Parse a single chunk, retrying on transient API errors or unparsable output.
+    Results are cached on disk by chunk text, model and prompt version.
+    """
+    cache_key = make_cache_key(chunk, model.model_name, PARSE_PROMPT_VERSION)
+    cached = get_cached_parse(cache_key)
+    if cached is not None:
+        return cached
+
+    # API errors (quota, overload) are retried with backoff under the key's rate limit;
+    # output that cannot be evaluated is asked for again up to PARSE_MAX_RETRIES times
+    prompt = PARSE_PROMPT_TEMPLATE.format(chunk=chunk)
+    retries = Config.PARSE_MAX_RETRIES if max_retries is None else max_retries
+    for attempt in range(retries + 1):
+        response = call_with_backoff(lambda: model.generate_content(prompt), model.api_key_hash, priority=BULK)
+        try:
+            parsed_dict = parse_llm_response(response.text)
+        except (ValueError, SyntaxError, TypeError):
+            if attempt == retries:
+                raise
+            continue
+        set_cached_parse(cache_key, parsed_dict)
+        return parsed_dict
 
-        match = re.match(r'^\s*\w+\s*=\s*(\{.*\})\s*$', text, re.DOTALL)
-        if match:
-            text = match.group(1)
 
-        parsed_dict = ast.literal_eval(text.strip())
+def get_parse_model(user_email: str = None):
+    """
+    Gemini model for a user's LLM settings (falls back to the default key/model),
+    reused across documents from the LLM client pool.
+    """
+    # Background ingestion jobs run outside of a request, so the owner is passed in explicitly
+    current_user = user_email or str(get_jwt_identity())
+    user_settings = Get_user_llm(current_user)
+
+    api_key = user_settings.get("api_key") if user_settings else None
+    llm_model = user_settings.get("llm_model") if user_settings else None
+
+    if not (api_key or get_default_api_key()):
+        raise ValueError("GEMINI_API_KEY not provided. Please set the GEMINI_API_KEY environment variable or configure it in user settings.")
+
+    return get_genai_model(llm_model or DEFAULT_MODEL, api_key)
+
+
+def parse_chunks_concurrently(model, chunks, concurrency=None):
+    """
+    Parse chunks with up to `concurrency` LLM calls in flight and return the parsed
+    dictionaries in chunk order. A chunk that keeps failing is replaced by its raw text.
+    """
+    max_workers = max(1, min(concurrency or Config.PARSE_CONCURRENCY, len(chunks) or 1))
+
+    # Chunks are sent concurrently; results are kept by index so content stays in document order
+    results = [None] * len(chunks)
+    errors = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(parse_chunk_LLM, model, chunk): idx for idx, chunk in enumerate(chunks)}
+        for future in as_completed(futures):
+            idx = futures[future]
+            try:
+                results[idx] = future.result()
+            except Exception as e:
+                errors.append(e)
+                # Isolate the failing chunk: keep its raw text instead of failing the whole document
+                print(f"WARNING: LLM parsing failed for chunk {idx + 1}/{len(chunks)}: {e}")
+                results[idx] = {"content": [{"section_title": "Untitled Section", "text": chunks[idx]}], "failed": True}
+
+    # Nothing could be parsed (bad API key, quota...): surface the error instead of storing raw text
+    if chunks and len(errors) == len(chunks):
+        raise errors[0]
+
+    return results
+
+
+def order_document_into_dictionary_LLM(raw_text: str, max_tokens=3000, user_email: str = None, concurrency=None):
+
+    model = get_parse_model(user_email)
+
+    all_chunks = split_text_smartly(raw_text, max_tokens=max_tokens)
+    results = parse_chunks_concurrently(model, all_chunks, concurrency=concurrency)
+
+    combined_content = []
+    final_metadata = {}
+    document_type = "generic"
+
+    for parsed_dict in results:
         combined_content.extend(parsed_dict.get("content", []))
 
-        if not final_metadata:
+        if not final_metadata and not parsed_dict.get("failed"):
             final_metadata = parsed_dict.get("metadata", {})
             document_type = parsed_dict.get("document_type", "generic")
 
@@ -111,3 +198,37 @@ def order_document_into_dictionary_LLM(raw_text: str, max_tokens=3000):
         "metadata": final_metadata,
         "content": combined_content
     }
+
+
+def iter_parsed_chunks_LLM(pages, max_tokens=3000, user_email: str = None, concurrency=None):
+    """
+    Streaming counterpart of order_document_into_dictionary_LLM.
+    Consumes an iterable of page texts and yields parsed dictionaries in document order,
+    holding at most one concurrent batch of text in memory.
+    """
+    model = get_parse_model(user_email)
+    concurrency = concurrency or Config.PARSE_CONCURRENCY
+    batch_words = max_tokens * concurrency
+
+    buffer = []
+    buffer_words = 0
+    for page_text in pages:
+        buffer.append(page_text)
+        buffer_words += len(page_text.split())
+        if buffer_words < batch_words:
+            continue
+
+        chunks = split_text_smartly("\n".join(buffer), max_tokens=max_tokens)
+        # The last chunk may continue on the next page: carry it over, unless the text
+        # could not be split (no blank lines or headings), which would grow the carry
+        # with every page
+        carry = ""
+        if len(chunks) > 1 and len(chunks[-1].split()) <= max_tokens:
+            carry = chunks.pop()
+        buffer = [carry] if carry else []
+        buffer_words = len(carry.split())
+
+        yield from parse_chunks_concurrently(model, chunks, concurrency=concurrency)
+
+    chunks = split_text_smartly("\n".join(buffer), max_tokens=max_tokens)
+    yield from parse_chunks_concurrently(model, chunks, concurrency=concurrency)
@@ -1,14 +1,24 @@
 from flask_jwt_extended import get_jwt_identity
-from app.services.llm_service import get_user_llm
+from app.services.llm_service import get_user_llm, get_qa_chain, resolve_api_key_hash, DEFAULT_MODEL
+from app.services.rate_limit_service import (
+    INTERACTIVE, call_with_backoff, acall_with_backoff, stream_with_backoff, astream_with_backoff
+)
 from app.services.user_service import Get_user_llm
 from app.services.retrieval_service import retrieve_documents,extract_mentioned_documents, map_filenames_to_ids
+from app.services.embedding_service import embed_query
+from app.services.answer_cache_service import context_fingerprint, get_cached_answer, set_cached_answer
 from langchain.prompts import PromptTemplate
-from langchain.chains import RetrievalQA
 from langchain.schema import BaseRetriever, Document
-from typing import List
+from pydantic import Field
+from typing import List, Optional
+import time
+from app.config import Config
 
 class CustomRetriever(BaseRetriever):
     user_email: str  
+    rerank: Optional[bool] = None
+    rerank_candidates: Optional[int] = None
+    timings: dict = Field(default_factory=dict)  # filled with per-stage durations of the last query
 
     def _get_relevant_documents(self, query: str) -> List[Document]:
         
@@ -19,7 +29,10 @@ class CustomRetriever(BaseRetriever):
             query,
             user_email=self.user_email,
             k=5,
-            specific_doc_ids=specific_doc_ids
+            specific_doc_ids=specific_doc_ids,
+            rerank=self.rerank,
+            rerank_candidates=self.rerank_candidates,
+            timings=self.timings
         )
 
 
@@ -43,37 +56,27 @@ Excerpts:
 Answer:
 """
 
-def generate_rag_response(query: str):
- 
-    current_user = str(get_jwt_identity())
-    print("DEBUG: current_user =", current_user, type(current_user))
+# Built once; the pooled QA chains are keyed on it
+ANSWER_PROMPT = PromptTemplate(template=prompt_template, input_variables=["context", "question"])
 
-    user_settings = Get_user_llm(current_user)
-    user_llm = get_user_llm(
-        llm_model=user_settings.get("llm_model") if user_settings else None,
-        api_key=user_settings.get("api_key") if user_settings else None
-    )
+def parse_rerank_options(data: dict):
+    """
+    Validate the optional "rerank" and "rerank_candidates" request fields; candidates
+    are capped at RERANK_MAX_CANDIDATES. Raises ValueError with a message for the client.
+    """
+    rerank = data.get("rerank")
+    if rerank is not None and not isinstance(rerank, bool):
+        raise ValueError("'rerank' must be true or false")
 
-    retriever = CustomRetriever(user_email=current_user)
-
-    qa_chain = RetrievalQA.from_chain_type(
-        llm=user_llm,
-        retriever=retriever,
-        chain_type="stuff",
-        return_source_documents=True,
-        chain_type_kwargs={
-            "prompt": PromptTemplate(
-                template=prompt_template,
-                input_variables=["context", "question"]
-            )
-        }
-    )
-
-    result = qa_chain.invoke({"query": query})
+    candidates = data.get("rerank_candidates")
+    if candidates is not None:
+        if isinstance(candidates, bool) or not isinstance(candidates, int) or candidates < 1:
+            raise ValueError("'rerank_candidates' must be a positive integer")
+        candidates = min(candidates, Config.RERANK_MAX_CANDIDATES)
+    return rerank, candidates
 
-    answer_text = result["result"]
-    source_docs = result.get("source_documents", [])
 
+def _rank_sources(source_docs):
     ranked_documents = []
     for idx, doc in enumerate(source_docs, start=1):
         doc_entry = {
@@ -84,8 +87,218 @@ def generate_rag_response(query: str):
             "text_excerpt": doc.page_content[:300]
         }
         ranked_documents.append(doc_entry)
+    return ranked_documents
+
+
+def _retrieve(query: str, user_email: str, rerank: bool = None, rerank_candidates: int = None):
+    """
+    Retrieval and answer-cache lookup shared by the blocking and streaming endpoints.
+    Returns (retriever, source_docs, cache_args, cached, user_settings), cache_args being
+    the (user, model, context fingerprint, query, query embedding) of the cache entry.
+    """
+    user_settings = Get_user_llm(user_email)
+    llm_model = (user_settings.get("llm_model") if user_settings else None) or DEFAULT_MODEL
+
+    retriever = CustomRetriever(
+        user_email=user_email,
+        rerank=rerank,
+        rerank_candidates=rerank_candidates
+    )
+
+    # Retrieval runs first so the answer cache can be checked against the exact context
+    source_docs = retriever.invoke(query)
+    fingerprint = context_fingerprint(source_docs)
+    query_embedding = embed_query(query)  # already computed by the retrieval, served from the query cache
+
+    cache_args = (user_email, llm_model, fingerprint, query, query_embedding)
+    cached = get_cached_answer(*cache_args)
+    return retriever, source_docs, cache_args, cached, user_settings
+
+
+def _store_answer(cache_args, answer_text: str, ranked_documents):
+    user_email, llm_model, fingerprint, query, query_embedding = cache_args
+    set_cached_answer(user_email, llm_model, fingerprint, query, answer_text, ranked_documents, query_embedding)
+
+
+def _get_llm(cache_args, user_settings):
+    return get_user_llm(
+        llm_model=cache_args[1],
+        api_key=user_settings.get("api_key") if user_settings else None
+    )
+
+
+def _get_chain(cache_args, user_settings):
+    return get_qa_chain(
+        ANSWER_PROMPT,
+        llm_model=cache_args[1],
+        api_key=user_settings.get("api_key") if user_settings else None
+    )
+
+
+def _key_hash(user_settings):
+    return resolve_api_key_hash(user_settings.get("api_key") if user_settings else None)
+
 
+def _elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+def _cached_response(cached, retriever, start):
+    answer_text, ranked_documents, match = cached
+    return {
+        "answer": answer_text,
+        "ranked_documents": ranked_documents,
+        "cached": True,
+        "cache_match": match,
+        "timings": {**retriever.timings, "total_ms": _elapsed_ms(start)}
+    }
+
+
+def _answer_response(answer_text, source_docs, cache_args, retriever, start, llm_start):
+    llm_ms = _elapsed_ms(llm_start)
+    ranked_documents = _rank_sources(source_docs)
+    _store_answer(cache_args, answer_text, ranked_documents)
     return {
         "answer": answer_text,
-        "ranked_documents": ranked_documents
+        "ranked_documents": ranked_documents,
+        "cached": False,
+        "timings": {**retriever.timings, "llm_ms": llm_ms, "total_ms": _elapsed_ms(start)}
+    }
+
+
+def generate_rag_response(query: str, rerank: bool = None, rerank_candidates: int = None):
+ 
+    start = time.perf_counter()
+    current_user = str(get_jwt_identity())
+
+    retriever, source_docs, cache_args, cached, user_settings = _retrieve(query, current_user, rerank, rerank_candidates)
+    if cached is not None:
+        return _cached_response(cached, retriever, start)
+
+    llm_start = time.perf_counter()
+    qa_chain = _get_chain(cache_args, user_settings)
+    result = call_with_backoff(
+        lambda: qa_chain.invoke({"input_documents": source_docs, "question": query}),
+        _key_hash(user_settings),
+        priority=INTERACTIVE
+    )
+    return _answer_response(result["output_text"], source_docs, cache_args, retriever, start, llm_start)
+
+
+async def agenerate_rag_response(query: str, user_email: str, run_sync, rerank: bool = None, rerank_candidates: int = None):
+    """
+    Async counterpart of generate_rag_response for the ASGI server: retrieval (embedding,
+    index and database reads) runs through `run_sync` on a worker thread, the LLM call is awaited.
+    """
+    start = time.perf_counter()
+    retriever, source_docs, cache_args, cached, user_settings = await run_sync(
+        _retrieve, query, user_email, rerank, rerank_candidates
+    )
+    if cached is not None:
+        return _cached_response(cached, retriever, start)
+
+    llm_start = time.perf_counter()
+    qa_chain = _get_chain(cache_args, user_settings)
+    result = await acall_with_backoff(
+        lambda: qa_chain.ainvoke({"input_documents": source_docs, "question": query}),
+        _key_hash(user_settings),
+        priority=INTERACTIVE
+    )
+    return _answer_response(result["output_text"], source_docs, cache_args, retriever, start, llm_start)
+
+
+def _cached_events(cached, retriever, start):
+    answer_text, ranked_documents, match = cached
+    return [
+        ("sources", {"ranked_documents": ranked_documents, "cached": True, "cache_match": match}),
+        ("token", {"text": answer_text}),
+        ("done", {"answer": answer_text, "cached": True, "timings": {**retriever.timings, "total_ms": _elapsed_ms(start)}})
+    ]
+
+
+def _stream_prompt(source_docs, query: str) -> str:
+    # Same context layout as the "stuff" chain of generate_rag_response
+    return ANSWER_PROMPT.format(
+        context="\n\n".join(doc.page_content for doc in source_docs),
+        question=query
+    )
+
+
+def _done_event(answer_parts, ranked_documents, cache_args, retriever, start, llm_start, first_token_ms):
+    answer_text = "".join(answer_parts)
+    _store_answer(cache_args, answer_text, ranked_documents)
+    return "done", {
+        "answer": answer_text,
+        "cached": False,
+        "timings": {
+            **retriever.timings,
+            "llm_first_token_ms": first_token_ms,
+            "llm_ms": _elapsed_ms(llm_start),
+            "total_ms": _elapsed_ms(start)
+        }
     }
+
+
+def stream_rag_response(query: str, user_email: str, rerank: bool = None, rerank_candidates: int = None):
+    """
+    Streaming counterpart of generate_rag_response. Yields (event, data) pairs:
+    "sources" once retrieval is done, "token" for each piece of the answer as the LLM
+    produces it, and "done" with the full answer and timings.
+    """
+    start = time.perf_counter()
+    retriever, source_docs, cache_args, cached, user_settings = _retrieve(query, user_email, rerank, rerank_candidates)
+
+    if cached is not None:
+        yield from _cached_events(cached, retriever, start)
+        return
+
+    ranked_documents = _rank_sources(source_docs)
+    yield "sources", {"ranked_documents": ranked_documents, "cached": False}
+
+    llm_start = time.perf_counter()
+    first_token_ms = None
+    answer_parts = []
+    llm = _get_llm(cache_args, user_settings)
+    prompt = _stream_prompt(source_docs, query)
+    for chunk in stream_with_backoff(lambda: llm.stream(prompt), _key_hash(user_settings), priority=INTERACTIVE):
+        if not chunk.content:
+            continue
+        if first_token_ms is None:
+            first_token_ms = _elapsed_ms(llm_start)
+        answer_parts.append(chunk.content)
+        yield "token", {"text": chunk.content}
+
+    yield _done_event(answer_parts, ranked_documents, cache_args, retriever, start, llm_start, first_token_ms)
+
+
+async def astream_rag_response(query: str, user_email: str, run_sync, rerank: bool = None, rerank_candidates: int = None):
+    """
+    Async counterpart of stream_rag_response (same events) for the ASGI server.
+    """
+    start = time.perf_counter()
+    retriever, source_docs, cache_args, cached, user_settings = await run_sync(
+        _retrieve, query, user_email, rerank, rerank_candidates
+    )
+
+    if cached is not None:
+        for event in _cached_events(cached, retriever, start):
+            yield event
+        return
+
+    ranked_documents = _rank_sources(source_docs)
+    yield "sources", {"ranked_documents": ranked_documents, "cached": False}
+
+    llm_start = time.perf_counter()
+    first_token_ms = None
+    answer_parts = []
+    llm = _get_llm(cache_args, user_settings)
+    prompt = _stream_prompt(source_docs, query)
+    async for chunk in astream_with_backoff(lambda: llm.astream(prompt), _key_hash(user_settings), priority=INTERACTIVE):
+        if not chunk.content:
+            continue
+        if first_token_ms is None:
+            first_token_ms = _elapsed_ms(llm_start)
+        answer_parts.append(chunk.content)
+        yield "token", {"text": chunk.content}
+
+    yield _done_event(answer_parts, ranked_documents, cache_args, retriever, start, llm_start, first_token_ms)
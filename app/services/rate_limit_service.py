@@ -0,0 +1,368 @@
+import asyncio
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+from ..config import Config
+
+# Gemini calls are throttled per API key (identified by its hash, see llm_service.api_key_hash):
+# - a token bucket shared by every worker process on the host (SQLite), so the default key
+#   shared by users without their own is not overrun by the sum of the workers;
+# - a cap on concurrent calls per key in this process;
+# - jittered exponential backoff on 429/5xx that honours the server's retry delay and
+#   pauses the whole bucket, so every caller slows down instead of retrying in lockstep.
+# Interactive calls (/api/ask) go first: bulk parsing waits while interactive calls are
+# queued and leaves LLM_INTERACTIVE_RESERVE of the bucket to them.
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+_initialized = False
+_gates = {}
+_gates_lock = threading.Lock()
+
+
+class RateLimitTimeout(Exception):
+    pass
+
+
+def _connect():
+    global _initialized
+    if not _initialized:
+        os.makedirs(os.path.dirname(Config.LLM_RATE_LIMIT_PATH), exist_ok=True)
+    conn = sqlite3.connect(Config.LLM_RATE_LIMIT_PATH, timeout=30, isolation_level=None)
+    if not _initialized:
+        conn.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+        _initialized = True
+    return conn
+
+
+def _take_token(key_hash: str, priority: str) -> float:
+    """
+    Take one token from the key's bucket. Returns 0 on success, otherwise the number of
+    seconds to wait before trying again.
+    """
+    rate = Config.LLM_RATE_LIMIT_PER_MINUTE / 60.0
+    if rate <= 0:
+        return 0.0
+    capacity = max(1.0, float(Config.LLM_BURST))
+    reserve = capacity * Config.LLM_INTERACTIVE_RESERVE if priority == BULK else 0.0
+
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key_hash,)).fetchone()
+        now = time.time()
+        tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+
+        if tokens - 1 >= reserve:
+            tokens -= 1
+            wait = 0.0
+        else:
+            wait = (reserve + 1 - tokens) / rate
+
+        conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)", (key_hash, tokens, now))
+        conn.execute("COMMIT")
+        return wait
+    finally:
+        conn.close()
+
+
+def _pause_bucket(key_hash: str, seconds: float):
+    # A negative balance makes every process wait `seconds` before the next call
+    rate = Config.LLM_RATE_LIMIT_PER_MINUTE / 60.0
+    if rate <= 0:
+        return
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+            (key_hash, -seconds * rate, time.time())
+        )
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+
+class _PriorityGate:
+    """
+    Concurrency cap for one key; bulk callers wait while interactive callers are queued.
+    Threads wait on the condition, coroutines on an asyncio.Event set from any thread.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self.waiting = {INTERACTIVE: 0, BULK: 0}
+        self.condition = threading.Condition()
+        self.async_waiters = set()
+
+    def _notify(self):
+        # Called with the condition held
+        self.condition.notify_all()
+        for loop, event in self.async_waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def _can_enter(self, priority):
+        if self.in_flight >= self.limit:
+            return False
+        return priority == INTERACTIVE or self.waiting[INTERACTIVE] == 0
+
+    def acquire(self, priority, timeout=None):
+        with self.condition:
+            self.waiting[priority] += 1
+            try:
+                if not self.condition.wait_for(lambda: self._can_enter(priority), timeout=timeout):
+                    raise RateLimitTimeout("Timed out waiting for an LLM slot")
+                self.in_flight += 1
+            finally:
+                self.waiting[priority] -= 1
+                self._notify()
+
+    def try_acquire(self, priority):
+        with self.condition:
+            if self._can_enter(priority):
+                self.in_flight += 1
+                return True
+            return False
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self._notify()
+
+    def add_async_waiter(self, priority):
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self.condition:
+            self.waiting[priority] += 1
+            self.async_waiters.add(waiter)
+        return waiter
+
+    def remove_async_waiter(self, priority, waiter):
+        with self.condition:
+            self.waiting[priority] -= 1
+            self.async_waiters.discard(waiter)
+            self._notify()
+
+
+def _get_gate(key_hash: str) -> _PriorityGate:
+    with _gates_lock:
+        gate = _gates.get(key_hash)
+        if gate is None:
+            gate = _gates[key_hash] = _PriorityGate(Config.LLM_MAX_CONCURRENCY)
+    return gate
+
+
+def _jitter(wait: float) -> float:
+    return wait + random.uniform(0, min(wait, 1.0) * 0.25)
+
+
+@contextmanager
+def llm_slot(key_hash: str, priority: str = BULK):
+    """
+    Hold a concurrency slot and one rate-limit token for the duration of an LLM call.
+    The slot is given back while waiting for a token, so callers sleeping on the bucket
+    (typically bulk parsing) never keep interactive calls out of the gate.
+    """
+    deadline = time.monotonic() + Config.LLM_QUEUE_TIMEOUT
+    gate = _get_gate(key_hash)
+    while True:
+        gate.acquire(priority, timeout=max(0.0, deadline - time.monotonic()))
+        try:
+            wait = _take_token(key_hash, priority)
+        except BaseException:
+            gate.release()
+            raise
+        if not wait:
+            break
+        gate.release()
+        if time.monotonic() + wait > deadline:
+            raise RateLimitTimeout("LLM rate limit: timed out waiting for quota")
+        time.sleep(_jitter(wait))
+    try:
+        yield
+    finally:
+        gate.release()
+
+
+async def _aacquire(gate: _PriorityGate, priority: str, deadline: float):
+    if gate.try_acquire(priority):
+        return
+    waiter = gate.add_async_waiter(priority)
+    try:
+        while not gate.try_acquire(priority):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RateLimitTimeout("Timed out waiting for an LLM slot")
+            try:
+                await asyncio.wait_for(waiter[1].wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+            waiter[1].clear()
+    finally:
+        gate.remove_async_waiter(priority, waiter)
+
+
+@asynccontextmanager
+async def allm_slot(key_hash: str, priority: str = INTERACTIVE):
+    """
+    Async counterpart of llm_slot: waits on the event loop instead of blocking a thread.
+    The SQLite bucket is updated on the default executor, since it may wait on other workers.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = time.monotonic() + Config.LLM_QUEUE_TIMEOUT
+    gate = _get_gate(key_hash)
+    while True:
+        await _aacquire(gate, priority, deadline)
+        try:
+            wait = await loop.run_in_executor(None, _take_token, key_hash, priority)
+        except BaseException:
+            gate.release()
+            raise
+        if not wait:
+            break
+        gate.release()
+        if time.monotonic() + wait > deadline:
+            raise RateLimitTimeout("LLM rate limit: timed out waiting for quota")
+        await asyncio.sleep(_jitter(wait))
+    try:
+        yield
+    finally:
+        gate.release()
+
+
+# ---------------------------------------------------------------- retries
+
+_RETRY_AFTER_PATTERNS = (
+    re.compile(r"retry in ([\d.]+)\s*s", re.IGNORECASE),
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)", re.IGNORECASE),
+    re.compile(r"retry-after[\"':\s]+([\d.]+)", re.IGNORECASE),
+)
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Quota (429), overload (500/503) and timeout errors; anything else (bad key, bad request) is final.
+    """
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if isinstance(code, int) and code in (429, 500, 502, 503, 504):
+        return True
+    name = type(error).__name__
+    if name in ("ResourceExhausted", "ServiceUnavailable", "InternalServerError", "DeadlineExceeded", "TooManyRequests"):
+        return True
+    message = str(error)
+    return "429" in message or "RESOURCE_EXHAUSTED" in message or "503" in message
+
+
+def retry_after_seconds(error: Exception):
+    """
+    Server-suggested delay, from a Retry-After header or the error details, if any.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers and headers.get("retry-after"):
+        try:
+            return float(headers["retry-after"])
+        except ValueError:
+            pass
+    for pattern in _RETRY_AFTER_PATTERNS:
+        match = pattern.search(str(error))
+        if match:
+            return float(match.group(1))
+    return None
+
+
+def _backoff_delay(error: Exception, attempt: int, key_hash: str) -> float:
+    delay = random.uniform(0, min(Config.LLM_BACKOFF_MAX, Config.LLM_BACKOFF_BASE * 2 ** attempt))
+    retry_after = retry_after_seconds(error)
+    if retry_after:
+        delay = max(delay, retry_after)
+        _pause_bucket(key_hash, retry_after)
+    return delay
+
+
+async def _abackoff_delay(error: Exception, attempt: int, key_hash: str) -> float:
+    # _backoff_delay may write the shared bucket: keep SQLite off the event loop
+    return await asyncio.get_running_loop().run_in_executor(None, _backoff_delay, error, attempt, key_hash)
+
+
+def call_with_backoff(fn, key_hash: str, priority: str = BULK, max_retries: int = None):
+    """
+    Run fn() under the key's rate limit, retrying transient API errors.
+    """
+    retries = Config.LLM_MAX_RETRIES if max_retries is None else max_retries
+    for attempt in range(retries + 1):
+        try:
+            with llm_slot(key_hash, priority):
+                return fn()
+        except Exception as e:
+            if attempt == retries or not is_retryable(e):
+                raise
+            time.sleep(_backoff_delay(e, attempt, key_hash))
+
+
+async def acall_with_backoff(make_coroutine, key_hash: str, priority: str = INTERACTIVE, max_retries: int = None):
+    """
+    Async counterpart of call_with_backoff; make_coroutine() creates a fresh awaitable per attempt.
+    """
+    retries = Config.LLM_MAX_RETRIES if max_retries is None else max_retries
+    for attempt in range(retries + 1):
+        try:
+            async with allm_slot(key_hash, priority):
+                return await make_coroutine()
+        except Exception as e:
+            if attempt == retries or not is_retryable(e):
+                raise
+            await asyncio.sleep(await _abackoff_delay(e, attempt, key_hash))
+
+
+def stream_with_backoff(make_stream, key_hash: str, priority: str = INTERACTIVE, max_retries: int = None):
+    """
+    Iterate make_stream() under the rate limit. Errors before the first item are retried;
+    once output has been produced, errors propagate.
+    """
+    retries = Config.LLM_MAX_RETRIES if max_retries is None else max_retries
+    for attempt in range(retries + 1):
+        with llm_slot(key_hash, priority):
+            stream = iter(make_stream())
+            try:
+                first = next(stream)
+            except StopIteration:
+                return
+            except Exception as e:
+                if attempt == retries or not is_retryable(e):
+                    raise
+                delay = _backoff_delay(e, attempt, key_hash)
+            else:
+                yield first
+                yield from stream
+                return
+        time.sleep(delay)
+
+
+async def astream_with_backoff(make_stream, key_hash: str, priority: str = INTERACTIVE, max_retries: int = None):
+    """
+    Async counterpart of stream_with_backoff for async iterators.
+    """
+    retries = Config.LLM_MAX_RETRIES if max_retries is None else max_retries
+    for attempt in range(retries + 1):
+        async with allm_slot(key_hash, priority):
+            stream = make_stream().__aiter__()
+            try:
+                first = await stream.__anext__()
+            except StopAsyncIteration:
+                return
+            except Exception as e:
+                if attempt == retries or not is_retryable(e):
+                    raise
+                delay = await _abackoff_delay(e, attempt, key_hash)
+            else:
+                yield first
+                async for item in stream:
+                    yield item
+                return
+        await asyncio.sleep(delay)
@@ -0,0 +1,48 @@
+import threading
+import time
+from ..config import Config
+
+_cross_encoder = None
+_lock = threading.Lock()
+
+
+def get_cross_encoder():
+    """
+    Local CPU cross-encoder, loaded on first use.
+    """
+    global _cross_encoder
+    with _lock:
+        if _cross_encoder is None:
+            from sentence_transformers import CrossEncoder
+            _cross_encoder = CrossEncoder(Config.RERANK_MODEL_NAME, device="cpu", max_length=512)
+    return _cross_encoder
+
+
+def rerank_chunks(query: str, chunks, top_k: int, budget_ms: float = None):
+    """
+    Score (text, metadata) chunks against the query in batches and keep the top_k.
+    Scoring stops once the latency budget is spent; chunks that were not scored keep
+    their retrieval order behind the scored ones.
+
+    Returns (chunks, timings).
+    """
+    budget_ms = Config.RERANK_BUDGET_MS if budget_ms is None else budget_ms
+    start = time.perf_counter()
+    model = get_cross_encoder()
+
+    scores = []
+    for batch_start in range(0, len(chunks), Config.RERANK_BATCH_SIZE):
+        batch = chunks[batch_start:batch_start + Config.RERANK_BATCH_SIZE]
+        scores.extend(model.predict([(query, text) for text, _ in batch]))
+        if (time.perf_counter() - start) * 1000 >= budget_ms:
+            break
+
+    scored = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+    order = scored + list(range(len(scores), len(chunks)))
+
+    timings = {
+        "rerank_ms": round((time.perf_counter() - start) * 1000, 1),
+        "rerank_candidates": len(chunks),
+        "rerank_scored": len(scores)
+    }
+    return [chunks[i] for i in order[:top_k]], timings
@@ -1,17 +1,22 @@
 from app.services.embedding_service import embed_query
 from app.services.vectorstore_service import query_vectorstore
-from app.services.document_service import get_document
-from app.services.document_service import get_all_documents_metadata
+from app.services.sparse_index_service import query_sparse_index, reciprocal_rank_fusion
+from app.services.reranking_service import rerank_chunks
+from app.config import Config
+from app.services.document_service import get_documents_metadata_by_ids
+from app.services.document_service import get_document_ids_by_filenames
 from langchain.schema import Document
 import re
+import time
 from typing import List
 
 def map_filenames_to_ids(filenames: List[str], user_email: str) -> List[str]:
     """
     Given a list of filenames (from @mentions), return the corresponding file_ids for the user.
     """
-    all_docs = get_all_documents_metadata(user_email)
-    filename_to_id = {doc.file_name: doc.id for doc in all_docs}
+    if not filenames:
+        return []
+    filename_to_id = get_document_ids_by_filenames(filenames, user_email)
     ids = []
     for f in filenames:
         if f in filename_to_id:
@@ -25,7 +30,34 @@ def extract_mentioned_documents(query: str) -> List[str]:
     """
     return re.findall(r"@(\S+)", query)
 
-def retrieve_documents(query: str, user_email: str, k=5, specific_doc_ids: List[str] = None):
+def search_chunks(query: str, user_email: str, k=5, doc_ids: List[str] = None):
+    """
+    Return the k best (text, metadata) chunks for the query.
+    In hybrid mode the dense Chroma results and the BM25 results (exact identifiers,
+    names, part numbers) are merged with reciprocal-rank fusion.
+    User and `doc_ids` filters are applied inside both indexes, not after the top-k.
+    """
+    query_embedding = embed_query(query)
+
+    where = {"user_email": user_email}
+    if doc_ids:
+        where = {"$and": [where, {"doc_id": {"$in": list(doc_ids)}}]}
+
+    if not Config.HYBRID_RETRIEVAL:
+        return query_vectorstore(query_embedding, user_email, k, where=where)
+
+    candidates = max(k, Config.HYBRID_CANDIDATES)
+    dense = query_vectorstore(query_embedding, user_email, candidates, return_ids=True, where=where)
+    sparse = query_sparse_index(query, user_email, k=candidates, doc_ids=doc_ids)
+
+    chunks = {chunk_id: (text, metadata) for chunk_id, text, metadata in sparse}
+    chunks.update({chunk_id: (text, metadata) for chunk_id, text, metadata in dense})
+
+    fused = reciprocal_rank_fusion([r[0] for r in dense], [r[0] for r in sparse])
+    return [chunks[chunk_id] for chunk_id in fused[:k]]
+
+def retrieve_documents(query: str, user_email: str, k=5, specific_doc_ids: List[str] = None,
+                       rerank: bool = None, rerank_candidates: int = None, timings: dict = None):
     """
     Retrieve documents relevant to the query, filtered by the user.
 
@@ -33,37 +65,60 @@ def retrieve_documents(query: str, user_email: str, k=5, specific_doc_ids: List[
         query (str): User's query text.
         user_email (str): Email of the logged-in user.
         k (int): Number of results to return.
+        rerank (bool): Over-fetch candidates and keep the k best according to the cross-encoder
+            (defaults to RERANK_ENABLED).
+        rerank_candidates (int): Number of candidates to over-fetch when reranking.
+        timings (dict): If given, filled with the duration of each retrieval stage.
 
     Returns:
         List[Document]: LangChain Document objects with metadata.
     """
-    query_embedding = embed_query(query)
-    raw_results = query_vectorstore(query_embedding, user_email, k)
+    timings = timings if timings is not None else {}
+    rerank = Config.RERANK_ENABLED if rerank is None else rerank
 
-    # Group chunks by document_id but only include those belonging to the user
-    grouped = {}
-    for text, metadata in raw_results:
-        # Filter by user
-        if metadata.get("user_email") != user_email:
-            continue
+    start = time.perf_counter()
+    wanted = max(k, rerank_candidates or Config.RERANK_CANDIDATES) if rerank else k
+
+    # Filters are pushed down to the indexes; the checks below are a safety net. If they
+    # still drop results, fetch again with a larger window (adaptive over-fetch).
+    fetch = wanted
+    while True:
+        raw_results = search_chunks(query, user_email, fetch, doc_ids=specific_doc_ids)
+        candidates = [
+            (text, metadata) for text, metadata in raw_results
+            if metadata.get("user_email") == user_email
+            and (not specific_doc_ids or metadata.get("doc_id") in specific_doc_ids)
+        ]
+        if len(candidates) >= wanted or len(raw_results) < fetch or fetch >= Config.RETRIEVAL_MAX_FETCH:
+            break
+        fetch = min(fetch * 2, Config.RETRIEVAL_MAX_FETCH)
+    timings["search_ms"] = round((time.perf_counter() - start) * 1000, 1)
 
+    if rerank:
+        candidates, rerank_timings = rerank_chunks(query, candidates, top_k=k)
+        timings.update(rerank_timings)
+    else:
+        candidates = candidates[:k]
+
+    # Group chunks by document_id
+    grouped = {}
+    for text, metadata in candidates:
         document_id = metadata.get("doc_id", "unknown_document")
 
-        if specific_doc_ids and document_id not in specific_doc_ids:
-            continue
-        
         if document_id != "unknown_document":
             metadata["document_url"] = f"http://localhost:5000/document_file/{document_id}"
         grouped.setdefault(document_id, []).append(text)
 
     grouped_docs = []
 
+    # One light query (or cache hit) for every document's file_name
+    documents_metadata = get_documents_metadata_by_ids(list(grouped.keys()), user_email)
+
     for document_id, texts in grouped.items():
         full_text = "\n\n---\n\n".join(texts)
 
-        # Get document metadata to retrieve file_name
-        doc_info = get_document(document_id, user_email)
-        file_name = doc_info.file_name if doc_info else document_id
+        doc_info = documents_metadata.get(document_id)
+        file_name = doc_info["file_name"] if doc_info else document_id
 
         grouped_docs.append(
             Document(
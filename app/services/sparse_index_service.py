@@ -0,0 +1,193 @@
+import json
+import math
+import os
+import re
+import sqlite3
+from collections import Counter
+from ..config import Config
+
+# Words, plus identifiers such as part numbers ("INV-2024-0042", "v1.2.3") kept whole
+TOKEN_PATTERN = re.compile(r"\w+(?:[-./]\w+)*", re.UNICODE)
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str):
+    """
+    Lowercased tokens; compound identifiers are indexed whole and by their parts.
+    """
+    tokens = []
+    for match in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(match)
+        if not match.isalnum():
+            tokens.extend(part for part in re.split(r"[-./]", match) if part)
+    return tokens
+
+
+def _index_path(user_email: str) -> str:
+    safe_name = user_email.replace("@", "_at_").replace(".", "_")
+    return os.path.join(Config.SPARSE_INDEX_DIR, f"documents_{safe_name}.sqlite")
+
+
+def _connect(user_email: str):
+    os.makedirs(Config.SPARSE_INDEX_DIR, exist_ok=True)
+    conn = sqlite3.connect(_index_path(user_email), timeout=30)
+    conn.executescript(
+        "CREATE TABLE IF NOT EXISTS chunks ("
+        "  chunk_id TEXT PRIMARY KEY, doc_id TEXT, length INTEGER NOT NULL, text TEXT NOT NULL, metadata TEXT NOT NULL);"
+        "CREATE INDEX IF NOT EXISTS ix_chunks_doc_id ON chunks (doc_id);"
+        "CREATE TABLE IF NOT EXISTS postings ("
+        "  term TEXT NOT NULL, chunk_id TEXT NOT NULL, tf INTEGER NOT NULL, PRIMARY KEY (term, chunk_id)) WITHOUT ROWID;"
+        "CREATE INDEX IF NOT EXISTS ix_postings_chunk_id ON postings (chunk_id);"
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);"
+    )
+    return conn
+
+
+def _insert_chunks(conn, texts, ids, metadatas):
+    for text, chunk_id, metadata in zip(texts, ids, metadatas):
+        counts = Counter(tokenize(text))
+        conn.execute(
+            "INSERT OR REPLACE INTO chunks (chunk_id, doc_id, length, text, metadata) VALUES (?, ?, ?, ?, ?)",
+            (chunk_id, metadata.get("doc_id"), sum(counts.values()), text, json.dumps(metadata))
+        )
+        conn.execute("DELETE FROM postings WHERE chunk_id = ?", (chunk_id,))
+        conn.executemany(
+            "INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)",
+            [(term, chunk_id, tf) for term, tf in counts.items()]
+        )
+
+
+def _ensure_backfilled(conn, user_email: str):
+    # Documents ingested before the sparse index existed only live in the vector store.
+    # The marker (not the file's existence) records that they were copied over, since an
+    # upload can create the file first.
+    if conn.execute("SELECT 1 FROM meta WHERE key = 'backfilled'").fetchone():
+        return
+    from .vectorstore_service import get_all_chunks
+
+    existing = get_all_chunks(user_email)
+    with conn:
+        # INSERT OR REPLACE: a concurrent backfill by another worker is harmless
+        _insert_chunks(conn, existing["documents"], existing["ids"], existing["metadatas"])
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('backfilled', '1')")
+
+
+def index_chunks_sparse(texts, ids, metadatas, user_email: str):
+    """
+    Add chunks to the user's BM25 index (same arguments as add_to_vectorstore).
+    """
+    conn = _connect(user_email)
+    try:
+        _ensure_backfilled(conn, user_email)
+        with conn:
+            _insert_chunks(conn, texts, ids, metadatas)
+    finally:
+        conn.close()
+
+
+def delete_document_sparse(doc_id: str, user_email: str):
+    """
+    Remove every chunk of a document from the user's BM25 index.
+    """
+    if not os.path.exists(_index_path(user_email)):
+        return
+    conn = _connect(user_email)
+    try:
+        with conn:
+            conn.execute("DELETE FROM postings WHERE chunk_id IN (SELECT chunk_id FROM chunks WHERE doc_id = ?)", (doc_id,))
+            conn.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+    finally:
+        conn.close()
+
+
+def count_sparse_chunks_by_document(user_email: str):
+    """
+    Number of indexed chunks per doc_id in the user's BM25 index.
+    """
+    if not os.path.exists(_index_path(user_email)):
+        return {}
+    conn = _connect(user_email)
+    try:
+        return dict(conn.execute("SELECT doc_id, COUNT(*) FROM chunks GROUP BY doc_id").fetchall())
+    finally:
+        conn.close()
+
+
+def compact_sparse_index(user_email: str):
+    """
+    VACUUM the user's BM25 index so pages freed by deletes go back to the filesystem.
+    Returns the number of bytes reclaimed.
+    """
+    path = _index_path(user_email)
+    if not os.path.exists(path):
+        return 0
+    before = os.path.getsize(path)
+    conn = _connect(user_email)
+    try:
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    return before - os.path.getsize(path)
+
+
+def query_sparse_index(query: str, user_email: str, k=20, doc_ids=None):
+    """
+    BM25 search over a user's chunks.
+    Returns a list of (chunk_id, text, metadata) ordered by decreasing score.
+    """
+    terms = set(tokenize(query))
+    if not terms:
+        return []
+
+    conn = _connect(user_email)
+    try:
+        _ensure_backfilled(conn, user_email)
+        total_chunks, avg_length = conn.execute("SELECT COUNT(*), AVG(length) FROM chunks").fetchone()
+        if not total_chunks:
+            return []
+
+        scores = Counter()
+        for term in terms:
+            postings = conn.execute(
+                "SELECT p.chunk_id, p.tf, c.length FROM postings p JOIN chunks c ON c.chunk_id = p.chunk_id WHERE p.term = ?",
+                (term,)
+            ).fetchall()
+            if not postings:
+                continue
+            idf = math.log(1 + (total_chunks - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, tf, length in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                scores[chunk_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        if doc_ids:
+            allowed = set(doc_ids)
+            placeholders = ",".join("?" * len(allowed))
+            kept = {row[0] for row in conn.execute(
+                f"SELECT chunk_id FROM chunks WHERE doc_id IN ({placeholders})", list(allowed)
+            )}
+            scores = Counter({cid: s for cid, s in scores.items() if cid in kept})
+
+        top = scores.most_common(k)
+        results = []
+        for chunk_id, _ in top:
+            text, metadata = conn.execute("SELECT text, metadata FROM chunks WHERE chunk_id = ?", (chunk_id,)).fetchone()
+            results.append((chunk_id, text, json.loads(metadata)))
+        return results
+    finally:
+        conn.close()
+
+
+def reciprocal_rank_fusion(*rankings, k=None):
+    """
+    Merge ranked lists of ids: score(id) = sum over lists of 1 / (RRF_K + rank).
+    Returns ids ordered by fused score.
+    """
+    rrf_k = Config.RRF_K if k is None else k
+    scores = Counter()
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] += 1.0 / (rrf_k + rank)
+    return [item_id for item_id, _ in scores.most_common()]
@@ -0,0 +1,120 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from ..config import Config
+
+STARTUP_MODES = ("eager", "lazy", "preload")
+
+# Load time (seconds) of each heavy resource once loaded in this process
+_loaded = {}
+_warm = threading.Event()
+
+
+def _timed(name, load):
+    start = time.perf_counter()
+    load()
+    _loaded[name] = round(time.perf_counter() - start, 3)
+
+
+def load_models():
+    """
+    Load the embedding model and the OCR agent in this process.
+    """
+    from .embedding_service import get_model
+    from .text_extraction_service import get_ocr_agent
+
+    # Workers using the shared embedding server never load a model of their own
+    if not Config.EMBEDDING_SERVER_SOCKET:
+        if Config.EMBEDDING_BACKEND == "onnx":
+            from .onnx_embedding_service import get_onnx_session
+            _timed("embedding_model", get_onnx_session)
+        else:
+            _timed("embedding_model", get_model)
+    _timed("ocr_agent", get_ocr_agent)
+
+
+def warmup():
+    """
+    Run one encode and open the vector store so the first request does not pay for it.
+    """
+    from .embedding_service import embed_query
+    from .vectorstore_service import get_chroma_client
+
+    _timed("vectorstore", get_chroma_client)
+    _timed("warmup_encode", lambda: embed_query("warmup"))
+    _warm.set()
+
+
+_preload_pid = None
+
+
+def _warmup_in_background():
+    # Only direct children of the preloading process are app workers; processes forked
+    # later by a worker (e.g. the PDF extraction pool) do not need a warm model
+    if os.getppid() == _preload_pid:
+        _warm.clear()
+        threading.Thread(target=warmup, name="warmup", daemon=True).start()
+
+
+def initialize_startup_mode(mode: str = None):
+    """
+    Called from create_app:
+    - "eager": load and warm everything before the app starts serving (previous behaviour)
+    - "lazy": load nothing; each resource is created on first use
+    - "preload": load model weights now (in the gunicorn master with --preload, so forked
+      workers share them copy-on-write) and warm up in each worker after fork. The
+      Chroma client is not fork-safe and is always opened in the worker.
+    """
+    mode = mode or Config.STARTUP_MODE
+    if mode not in STARTUP_MODES:
+        raise ValueError(f"STARTUP_MODE must be one of {', '.join(STARTUP_MODES)}")
+
+    if mode == "eager":
+        load_models()
+        warmup()
+    elif mode == "preload":
+        global _preload_pid
+        load_models()
+        _preload_pid = os.getpid()
+        # Running inference before fork can hang OpenMP in the children, so warm up after it
+        os.register_at_fork(after_in_child=_warmup_in_background)
+        # Served without forking (flask run, single-process uvicorn): the models are
+        # loaded and no worker will warm up, so this process is ready. Forked workers
+        # clear the flag until their own warmup is done.
+        _warm.set()
+
+
+def get_readiness():
+    """
+    Readiness report: in lazy mode the app is ready immediately, otherwise once warm.
+    """
+    return {
+        "mode": Config.STARTUP_MODE,
+        "ready": Config.STARTUP_MODE == "lazy" or _warm.is_set(),
+        "warm": _warm.is_set(),
+        "loaded": dict(_loaded)
+    }
+
+
+def measure_startup_times(modes=STARTUP_MODES):
+    """
+    Time `create_app()` in a fresh interpreter for each startup mode.
+    """
+    script = (
+        "import time; start = time.perf_counter(); "
+        "from app import create_app; create_app(); "
+        "print(time.perf_counter() - start)"
+    )
+    results = {}
+    for mode in modes:
+        env = {**os.environ, "STARTUP_MODE": mode}
+        output = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, check=True)
+        results[mode] = round(float(output.stdout.strip().splitlines()[-1]), 3)
+    return results
+
+
+if __name__ == "__main__":
+    for mode, seconds in measure_startup_times().items():
+        print(f"{mode:8s} {seconds:.3f}s")
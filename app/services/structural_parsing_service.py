@@ -0,0 +1,156 @@
+import os
+import re
+from collections import Counter
+import fitz
+from docx import Document
+from .text_extraction_service import extract_text, extract_pdf_page, iter_pdf_pages
+
+# Markdown headings, numbered headings ("2.1 Scope") and short upper-case lines ("EXPERIENCE:")
+HEADING_PATTERN = re.compile(r'^(#{1,6}\s+\S.*|\d+(\.\d+)*\.?\s+[A-Z].{0,80}|[A-Z][A-Z0-9\s&/\-]{2,80}:?)$')
+MAX_HEADING_LENGTH = 120
+
+
+def _add_section(content, title, lines):
+    text = "\n".join(lines).strip()
+    if text:
+        content.append({"section_title": title or "Untitled Section", "text": text})
+
+
+def _build_document(content, document_type, metadata):
+    # A single untitled section means no usable structure was found
+    if not content or (len(content) == 1 and content[0]["section_title"] == "Untitled Section"):
+        return None
+
+    return {
+        "document_type": document_type,
+        "metadata": {k: v for k, v in metadata.items() if v},
+        "content": content
+    }
+
+
+def parse_text_structure(raw_text: str, document_type: str = "text", metadata: dict = None):
+    """
+    Split plain text into sections on heading-like lines.
+    """
+    content = []
+    title, lines = None, []
+
+    for line in raw_text.splitlines():
+        stripped = line.strip()
+        if stripped and len(stripped) <= MAX_HEADING_LENGTH and HEADING_PATTERN.match(stripped):
+            _add_section(content, title, lines)
+            title, lines = stripped.lstrip("#").strip().rstrip(":"), []
+        else:
+            lines.append(line)
+    _add_section(content, title, lines)
+
+    return _build_document(content, document_type, metadata or {})
+
+
+def parse_docx_structure(file_path: str):
+    """
+    Use Word paragraph styles (Title, Heading 1..n) as section boundaries.
+    """
+    doc = Document(file_path)
+    content = []
+    title, lines = None, []
+
+    for para in doc.paragraphs:
+        style_name = para.style.name if para.style is not None else ""
+        if para.text.strip() and (style_name.startswith("Heading") or style_name == "Title"):
+            _add_section(content, title, lines)
+            title, lines = para.text.strip(), []
+        else:
+            lines.append(para.text)
+    _add_section(content, title, lines)
+
+    props = doc.core_properties
+    metadata = {
+        "author": props.author,
+        "title": props.title,
+        "date": props.created.isoformat() if props.created else None
+    }
+
+    result = _build_document(content, "docx", metadata)
+    if result is None:
+        # No heading styles: fall back to heading-like lines in the text
+        result = parse_text_structure("\n".join(p.text for p in doc.paragraphs), "docx", metadata)
+    return result
+
+
+def _pdf_lines(page):
+    """Yield (text, max font size, is_bold) for each text line of a PDF page."""
+    for block in page.get_text("dict")["blocks"]:
+        for line in block.get("lines", []):
+            spans = [span for span in line["spans"] if span["text"].strip()]
+            if not spans:
+                continue
+            text = " ".join(span["text"].strip() for span in spans)
+            size = max(span["size"] for span in spans)
+            # Bit 4 of the span flags marks a bold font
+            bold = all(span["flags"] & 16 for span in spans)
+            yield text, size, bold
+
+
+def parse_pdf_structure(file_path: str):
+    """
+    Use PyMuPDF font sizes and bold spans: lines noticeably larger than the body text,
+    or short fully bold lines, start a new section. Pages without a text layer are OCRed.
+    """
+    with fitz.open(file_path) as doc:
+        metadata = {
+            "author": doc.metadata.get("author"),
+            "title": doc.metadata.get("title"),
+            "date": doc.metadata.get("creationDate")
+        }
+
+        pages = [list(_pdf_lines(page)) for page in doc]
+
+    # Body font size = the size carrying the most characters
+    size_weights = Counter()
+    for lines in pages:
+        for text, size, _ in lines:
+            size_weights[round(size, 1)] += len(text)
+    if not size_weights:
+        return parse_text_structure("\n".join(iter_pdf_pages(file_path)), "pdf", metadata)
+    body_size = size_weights.most_common(1)[0][0]
+
+    content = []
+    title, body = None, []
+
+    for page_number, lines in enumerate(pages):
+        if not lines:
+            # Scanned page: OCR text has no font information, keep it in the current section
+            body.append(extract_pdf_page(file_path, page_number))
+            continue
+
+        for text, size, bold in lines:
+            is_heading = len(text) <= MAX_HEADING_LENGTH and (size >= body_size * 1.15 or (bold and size >= body_size))
+            if is_heading:
+                _add_section(content, title, body)
+                title, body = text, []
+            else:
+                body.append(text)
+    _add_section(content, title, body)
+
+    return _build_document(content, "pdf", metadata)
+
+
+def order_document_into_dictionary_structural(file_path: str):
+    """
+    Deterministic, LLM-free parser producing the same
+    {document_type, metadata, content: [{section_title, text}]} dictionary as
+    order_document_into_dictionary_LLM. Returns None when no usable structure is
+    found so the caller can fall back to the LLM.
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+
+    if ext == ".docx":
+        return parse_docx_structure(file_path)
+    elif ext == ".pdf":
+        return parse_pdf_structure(file_path)
+    elif ext == ".txt":
+        return parse_text_structure(extract_text(file_path))
+
+    # Images and other formats only have OCR text: leave them to the LLM
+    return None
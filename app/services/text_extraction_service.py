@@ -1,12 +1,156 @@
 import pytesseract as pt
 from PIL import Image
-import layoutparser as lp
 import fitz
 from docx import Document
 import os
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from ..config import Config
 
 pt.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
-ocr_agent = lp.TesseractAgent(languages="eng")
+# OCR agent, created on first use (see startup_service for eager loading)
+ocr_agent = None
+_ocr_agent_lock = threading.Lock()
+
+
+def get_ocr_agent():
+    global ocr_agent
+    with _ocr_agent_lock:
+        if ocr_agent is None:
+            import layoutparser as lp
+            ocr_agent = lp.TesseractAgent(languages="eng")
+    return ocr_agent
+
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+
+def _get_pdf_pool():
+    """
+    Process pool for page-parallel PDF extraction, created on first use.
+    Workers are spawned, not forked: the pool is created from ingest threads of a process
+    that already runs torch and gRPC threads, and forking it can deadlock the child.
+    """
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            _pdf_pool = ProcessPoolExecutor(
+                max_workers=Config.EXTRACT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pdf_pool
+
+
+def _reset_pdf_pool(pool):
+    # A worker died (OOM, crash): the pool is unusable, the next document gets a new one
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is pool:
+            _pdf_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _extract_page_range(file_path: str, start: int, end: int, dpi: int):
+    """
+    Extract pages [start, end) of a PDF, falling back to OCR for pages without a text layer.
+    Runs in the worker processes, so it opens its own handle on the file.
+    """
+    page_texts = []
+    with fitz.open(file_path) as doc:
+        for page_number in range(start, end):
+            page = doc[page_number]
+            page_text = page.get_text("text")
+            if not page_text.strip():  # fallback to OCR if empty
+                pix = page.get_pixmap(dpi=dpi)
+                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+                page_text = get_ocr_agent().detect(img)
+            page_texts.append(page_text)
+    return page_texts
+
+
+def extract_pdf_page(file_path: str, page_number: int, dpi: int = None) -> str:
+    """
+    Extract a single PDF page (OCR if it has no text layer).
+    """
+    return _extract_page_range(file_path, page_number, page_number + 1, dpi or Config.OCR_DPI)[0]
+
+
+def iter_pdf_pages(file_path: str, workers: int = None, dpi: int = None):
+    """
+    Yield the text of each PDF page, in page order.
+    Large PDFs are split into contiguous ranges of PDF_PAGES_PER_TASK pages spread over
+    a process pool; at most `workers * 2` ranges are in flight so memory stays flat.
+    """
+    workers = workers or Config.EXTRACT_WORKERS
+    dpi = dpi or Config.OCR_DPI
+
+    with fitz.open(file_path) as doc:
+        page_count = doc.page_count
+
+    if workers <= 1 or page_count < Config.EXTRACT_PARALLEL_MIN_PAGES:
+        for page_number in range(page_count):
+            yield from _extract_page_range(file_path, page_number, page_number + 1, dpi)
+        return
+
+    # Fixed-size ranges: pages held in memory and the wait for the first pages do not
+    # grow with the document
+    range_size = max(1, Config.PDF_PAGES_PER_TASK)
+    ranges = [(start, min(start + range_size, page_count)) for start in range(0, page_count, range_size)]
+
+    pool = _get_pdf_pool()
+    in_flight = []
+    try:
+        for start, end in ranges:
+            in_flight.append(pool.submit(_extract_page_range, file_path, start, end, dpi))
+            if len(in_flight) >= workers * 2:
+                # Futures are consumed in submission order, which preserves page order
+                yield from in_flight.pop(0).result()
+        for future in in_flight:
+            yield from future.result()
+    except BrokenProcessPool:
+        _reset_pdf_pool(pool)
+        raise
+
+
+def extract_pdf_pages(file_path: str, workers: int = None, dpi: int = None):
+    """
+    Return the text of each PDF page, in page order.
+    """
+    return list(iter_pdf_pages(file_path, workers=workers, dpi=dpi))
+
+
+def iter_text_pages(file_path: str, lines_per_page: int = 200):
+    """
+    Yield a document's text piece by piece (PDF pages, groups of DOCX paragraphs or
+    TXT lines) for the streaming ingestion pipeline.
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+
+    if ext == ".pdf":
+        yield from iter_pdf_pages(file_path)
+
+    elif ext == ".docx":
+        doc = Document(file_path)
+        paragraphs = [para.text for para in doc.paragraphs]
+        for start in range(0, len(paragraphs), lines_per_page):
+            yield "\n".join(paragraphs[start:start + lines_per_page])
+
+    elif ext == ".txt":
+        with open(file_path, "r", encoding="utf-8") as f:
+            lines = []
+            for line in f:
+                lines.append(line)
+                if len(lines) >= lines_per_page:
+                    yield "".join(lines)
+                    lines = []
+            if lines:
+                yield "".join(lines)
+
+    else:
+        yield extract_text(file_path)
+
 
 def extract_text(file_path: str) -> str:
     ext = os.path.splitext(file_path)[1].lower()
@@ -14,20 +158,11 @@ def extract_text(file_path: str) -> str:
     # Images
     if ext in [".png", ".jpg", ".jpeg", ".bmp", ".tiff"]:
         image = Image.open(file_path)
-        return ocr_agent.detect(image)
+        return get_ocr_agent().detect(image)
 
     #PDFs
     elif ext == ".pdf":
-        text = ""
-        with fitz.open(file_path) as doc:
-            for page in doc:
-                page_text = page.get_text("text")
-                if not page_text.strip():  # fallback to OCR if empty
-                    pix = page.get_pixmap()
-                    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                    page_text = ocr_agent.detect(img)
-                text += page_text + "\n"
-        return text.strip()
+        return "\n".join(extract_pdf_pages(file_path)).strip()
     #Documents word
     elif ext == ".docx":
         doc = Document(file_path)
@@ -1,9 +1,16 @@
-from .text_extraction_service import extract_text
-from .parsing_service import order_document_into_dictionary_LLM
+import uuid
+from sqlalchemy.exc import IntegrityError
+from .text_extraction_service import extract_text, iter_text_pages
+from .parsing_service import order_document_into_dictionary_LLM, iter_parsed_chunks_LLM
+from .structural_parsing_service import order_document_into_dictionary_structural
+from .user_service import Get_user_llm
 from .chunking_service import chunk_document
 from .embedding_service import embed_texts
-from .vectorstore_service import add_to_vectorstore
-from .document_service import save_document
+from .vectorstore_service import add_to_vectorstore, delete_document_vectors
+from .sparse_index_service import index_chunks_sparse, delete_document_sparse
+from .document_service import save_document, compute_content_hash, find_document_by_hash
+from ..config import Config
+from ..extentions import db
 
 def sanitize_metadata(metadata):
     """
@@ -27,13 +34,54 @@ def sanitize_metadata(metadata):
             sanitized[key] = str(value)
     return sanitized
 
-def process_document_pipeline(document_path: str, document_url: str = "", user_email: str = None) -> str:
-    raw_text = extract_text(document_path)
-    doc_dict = order_document_into_dictionary_LLM(raw_text)
-    chunks, doc_id = chunk_document(doc_dict, document_url)
+def resolve_parser_mode(parser_mode: str = None, user_email: str = None) -> str:
+    """
+    Parser for an upload: explicit choice, then the user's setting, then DEFAULT_PARSER_MODE.
+    """
+    if parser_mode:
+        return parser_mode
+    user_settings = Get_user_llm(user_email) if user_email else None
+    return (user_settings or {}).get("parser_mode") or Config.DEFAULT_PARSER_MODE
+
+
+def process_document_pipeline(document_path: str, document_url: str = "", user_email: str = None, on_stage=None, mode: str = None, parser_mode: str = None) -> str:
+    """
+    Run extract -> parse -> chunk -> embed -> upsert for a single file.
+    `on_stage(stage, progress)` is called before each step so callers (the ingestion
+    job queue) can report where a file currently is.
+    `mode` is "batch" (whole document at each step) or "streaming" (bounded batches),
+    defaulting to INGEST_PIPELINE_MODE.
+    `parser_mode` is "llm" or "structural" (see resolve_parser_mode); the structural
+    parser falls back to the LLM when it finds no headings. It reads the whole document
+    at once, so in streaming mode only embedding and upserts are batched for it.
+    """
+    report = on_stage or (lambda stage, progress: None)
+
+    # Identical bytes already ingested for this user: reuse the stored document, chunks and vectors
+    content_hash = compute_content_hash(document_path)
+    existing_doc_id = find_document_by_hash(content_hash, user_email)
+    if existing_doc_id:
+        report("deduplicated", 1.0)
+        return existing_doc_id
+
+    doc_dict = None
+    if resolve_parser_mode(parser_mode, user_email) == "structural":
+        report("parse", 0.0)
+        doc_dict = order_document_into_dictionary_structural(document_path)
+
+    if (mode or Config.INGEST_PIPELINE_MODE) == "streaming":
+        parsed_dicts = [doc_dict] if doc_dict is not None else None
+        return _process_document_streaming(document_path, document_url, user_email, content_hash, report, parsed_dicts)
 
-    # Pass the user_email to save_document
-    save_document(doc_id, document_path, user_email=user_email)
+    if doc_dict is None:
+        report("extract", 0.0)
+        raw_text = extract_text(document_path)
+
+        report("parse", 0.2)
+        doc_dict = order_document_into_dictionary_LLM(raw_text, user_email=user_email)
+
+    report("chunk", 0.6)
+    chunks, doc_id = chunk_document(doc_dict, document_url)
 
     texts = [chunk["text"] for chunk in chunks]
     ids = [chunk["id"] for chunk in chunks]
@@ -45,7 +93,95 @@ def process_document_pipeline(document_path: str, document_url: str = "", user_e
     ]
 
     # Pass the user_email to add_to_vectorstore
+    report("embed", 0.7)
     embeddings = embed_texts(texts)
+
+    report("upsert", 0.9)
     add_to_vectorstore(texts, ids, metadatas, embeddings, user_email=user_email)
+    index_chunks_sparse(texts, ids, metadatas, user_email=user_email)
+
+    # Saved last so a stored document (and its content_hash) always has its vectors
+    return _save_or_reuse(doc_id, document_path, user_email, content_hash)
+
+
+def _save_or_reuse(doc_id: str, document_path: str, user_email: str, content_hash: str) -> str:
+    """
+    Store the document, unless an identical upload processed concurrently was stored
+    first (unique user/content_hash index): then drop this copy's chunks and reuse it.
+    """
+    try:
+        save_document(doc_id, document_path, user_email=user_email, content_hash=content_hash)
+        return doc_id
+    except IntegrityError:
+        db.session.rollback()
+        existing_doc_id = find_document_by_hash(content_hash, user_email)
+        if existing_doc_id is None:
+            raise
+        delete_document_vectors(doc_id, user_email)
+        delete_document_sparse(doc_id, user_email)
+        return existing_doc_id
+
+
+def _upsert_chunk_batch(chunks, user_email: str):
+    texts = [chunk["text"] for chunk in chunks]
+    ids = [chunk["id"] for chunk in chunks]
+    metadatas = [
+        sanitize_metadata({**chunk["metadata"], "user_email": user_email})
+        for chunk in chunks
+    ]
+    embeddings = embed_texts(texts)
+    add_to_vectorstore(texts, ids, metadatas, embeddings, user_email=user_email)
+    index_chunks_sparse(texts, ids, metadatas, user_email=user_email)
+
+
+def _process_document_streaming(document_path: str, document_url: str, user_email: str, content_hash: str, report, parsed_dicts=None) -> str:
+    """
+    Generator-driven pipeline: pages flow through parsing and chunking, and chunks are
+    embedded and upserted every INGEST_BATCH_SIZE chunks. Peak memory is bounded by one
+    parse batch plus one chunk batch, and early chunks are searchable while later pages
+    are still being extracted. `parsed_dicts` replaces the LLM parser when the document
+    was already parsed (structural parser).
+    """
+    doc_id = str(uuid.uuid4())
+    document_type = "generic"
+    metadata = None
+    batch = []
+    batch_count = 0
+
+    report("stream", 0.0)
+    try:
+        if parsed_dicts is None:
+            parsed_dicts = iter_parsed_chunks_LLM(iter_text_pages(document_path), user_email=user_email)
+
+        for parsed_dict in parsed_dicts:
+            # Same rule as the batch parser: the first successfully parsed chunk sets metadata
+            if metadata is None and not parsed_dict.get("failed"):
+                metadata = parsed_dict.get("metadata", {})
+                document_type = parsed_dict.get("document_type", "generic")
+
+            section_dict = {
+                "document_type": document_type,
+                "metadata": metadata or {},
+                "content": parsed_dict.get("content", [])
+            }
+            chunks, _ = chunk_document(section_dict, document_url, doc_id=doc_id)
+            batch.extend(chunks)
+
+            while len(batch) >= Config.INGEST_BATCH_SIZE:
+                _upsert_chunk_batch(batch[:Config.INGEST_BATCH_SIZE], user_email)
+                batch = batch[Config.INGEST_BATCH_SIZE:]
+                batch_count += 1
+                # Total size is unknown while streaming: progress approaches 0.9 asymptotically
+                report("stream", 0.9 * batch_count / (batch_count + 1))
+
+        if batch:
+            _upsert_chunk_batch(batch, user_email)
+
+    except Exception:
+        # Do not leave a partially indexed document behind
+        delete_document_vectors(doc_id, user_email)
+        delete_document_sparse(doc_id, user_email)
+        raise
 
-    return doc_id
+    report("save", 0.95)
+    return _save_or_reuse(doc_id, document_path, user_email, content_hash)
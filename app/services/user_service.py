@@ -1,6 +1,15 @@
 from ..models.user import User
 from ..extentions import db
+from ..config import Config
+from cachetools import TTLCache
 from datetime import datetime
+import threading
+
+# LLM settings read on every question and every parsed document. Updates made through
+# Update_user_llm are seen at once by this process only; other workers keep the old settings
+# until their entry expires (USER_SETTINGS_CACHE_TTL).
+_llm_settings_cache = TTLCache(maxsize=Config.USER_SETTINGS_CACHE_SIZE, ttl=Config.USER_SETTINGS_CACHE_TTL)
+_llm_settings_lock = threading.Lock()
 
 def Create_user(data):
     existing_user = User.query.filter_by(email=data.get('email')).first()
@@ -19,7 +28,7 @@ def Get_user_by_email(user_email):
     user = User.query.filter_by(email=user_email).first()
     return user
 
-def Update_user_llm(email, llm_model=None, api_key=None):
+def Update_user_llm(email, llm_model=None, api_key=None, parser_mode=None):
     user = User.query.get(email)
     if not user:
         return None
@@ -28,17 +37,30 @@ def Update_user_llm(email, llm_model=None, api_key=None):
         user.llm_model = llm_model
     if api_key is not None:
         user.api_key = api_key
+    if parser_mode is not None:
+        user.parser_mode = parser_mode
 
     db.session.commit()
+    with _llm_settings_lock:
+        _llm_settings_cache.pop(email, None)
     return user
 
 
 def Get_user_llm(email):
+    with _llm_settings_lock:
+        cached = _llm_settings_cache.get(email)
+    if cached is not None:
+        return dict(cached)
+
     user = User.query.get(email)
     if not user:
         return None
 
-    return {
+    settings = {
         "llm_model": user.llm_model,
-        "api_key": user.api_key
-    }
\ No newline at end of file
+        "api_key": user.api_key,
+        "parser_mode": user.parser_mode
+    }
+    with _llm_settings_lock:
+        _llm_settings_cache[email] = settings
+    return dict(settings)
@@ -1,24 +1,54 @@
-import chromadb
+import threading
+from ..config import Config
 
-# Persistent Chroma client
-chroma_client = chromadb.PersistentClient(path="app/db/chroma_db")
+# Persistent Chroma client, created on first use (see startup_service for eager loading)
+chroma_client = None
+_client_lock = threading.Lock()
+
+# Collection handles, one per user, reused across ingests and queries
+_collections = {}
+
+
+def get_chroma_client():
+    global chroma_client
+    with _client_lock:
+        if chroma_client is None:
+            import chromadb
+            chroma_client = chromadb.PersistentClient(path="app/db/chroma_db")
+    return chroma_client
+
+
+def get_collection_name(user_email: str) -> str:
+    # You can sanitize the name to avoid special character issues
+    safe_name = user_email.replace("@", "_at_").replace(".", "_")
+    return f"documents_{safe_name}"
 
 
 def get_user_collection(user_email: str):
     """
     Retrieve or create a user-specific collection to isolate embeddings per user.
     """
-    print("DEBUG: user_email before replace =", user_email, type(user_email))
-    # You can sanitize the name to avoid special character issues
-    safe_name = user_email.replace("@", "_at_").replace(".", "_")
-    collection_name = f"documents_{safe_name}"
-    return chroma_client.get_or_create_collection(name=collection_name)
+    collection = _collections.get(user_email)
+    if collection is None:
+        collection = get_chroma_client().get_or_create_collection(name=get_collection_name(user_email))
+        _collections[user_email] = collection
+    return collection
+
+
+def _use_numpy_backend() -> bool:
+    # VECTOR_BACKEND="numpy" switches to the in-process memory-mapped index
+    return Config.VECTOR_BACKEND == "numpy"
 
 
 def add_to_vectorstore(texts, ids, metadatas, embeddings, user_email: str):
     """
     Add embedded documents to the vectorstore for a specific user.
     """
+    if _use_numpy_backend():
+        from . import numpy_vectorstore_service
+        numpy_vectorstore_service.add(texts, ids, metadatas, embeddings, user_email=user_email)
+        return
+
     collection = get_user_collection(user_email)
     collection.add(
         documents=texts,
@@ -28,12 +58,73 @@ def add_to_vectorstore(texts, ids, metadatas, embeddings, user_email: str):
     )
 
 
-def query_vectorstore(query_embedding, user_email: str, k=5):
+def query_vectorstore(query_embedding, user_email: str, k=5, return_ids: bool = False, where: dict = None):
     """
     Query a user’s personal vectorstore collection.
+    `where` is a Chroma metadata filter applied before the nearest-neighbour cut-off.
+    With `return_ids`, results are (chunk_id, document, metadata) triples.
     """
-    collection = get_user_collection(user_email)
-    results = collection.query(query_embeddings=query_embedding, n_results=k)
+    if _use_numpy_backend():
+        from . import numpy_vectorstore_service
+        results = numpy_vectorstore_service.query(query_embedding, user_email, k=k, where=where)
+    else:
+        collection = get_user_collection(user_email)
+        results = collection.query(query_embeddings=query_embedding, n_results=k, where=where)
+
+    if return_ids:
+        return list(zip(results["ids"][0], results["documents"][0], results["metadatas"][0]))
 
     # Return list of (document, metadata) pairs
     return list(zip(results["documents"][0], results["metadatas"][0]))
+
+
+def get_all_chunks(user_email: str):
+    """
+    Every stored chunk of a user: {"ids": [...], "documents": [...], "metadatas": [...]}.
+    """
+    if _use_numpy_backend():
+        from . import numpy_vectorstore_service
+        return numpy_vectorstore_service.get_all(user_email)
+
+    return get_user_collection(user_email).get(include=["documents", "metadatas"])
+
+
+def delete_document_vectors(doc_id: str, user_email: str):
+    """
+    Remove every chunk of a document from a user's collection.
+    """
+    if _use_numpy_backend():
+        from . import numpy_vectorstore_service
+        numpy_vectorstore_service.delete(user_email, where={"doc_id": doc_id})
+        return
+
+    collection = get_user_collection(user_email)
+    collection.delete(where={"doc_id": doc_id})
+
+
+def count_chunks_by_document(user_email: str):
+    """
+    Number of stored chunks per doc_id in a user's collection (metadata only).
+    """
+    if _use_numpy_backend():
+        from . import numpy_vectorstore_service
+        metadatas = numpy_vectorstore_service.get_store(user_email).live_metadatas()
+    else:
+        metadatas = get_user_collection(user_email).get(include=["metadatas"])["metadatas"]
+
+    counts = {}
+    for metadata in metadatas:
+        doc_id = (metadata or {}).get("doc_id")
+        counts[doc_id] = counts.get(doc_id, 0) + 1
+    return counts
+
+
+def compact_vectorstore(user_email: str) -> int:
+    """
+    Reclaim the space of deleted chunks. Returns the number of rows reclaimed.
+    Chroma compacts its own segments, so only the NumPy backend has work to do here.
+    """
+    if _use_numpy_backend():
+        from . import numpy_vectorstore_service
+        return numpy_vectorstore_service.compact(user_email)
+    return 0
@@ -0,0 +1,37 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+
+
+def add_missing_columns(db):
+    """
+    `db.create_all()` only creates missing tables. Add columns (and their indexes)
+    introduced after a table was first created so existing SQLite databases keep working.
+    New columns must be nullable. A unique index the existing rows violate is skipped
+    with a warning, so the data can be fixed up first (see backfill_content_hashes).
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    missing_indexes = []
+
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+
+            existing_indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+            missing_indexes.extend(index for index in table.indexes if index.name not in existing_indexes)
+
+    # One transaction per index, so a failing one does not undo the columns
+    for index in missing_indexes:
+        try:
+            with db.engine.begin() as conn:
+                index.create(bind=conn, checkfirst=True)
+        except IntegrityError as e:
+            print(f"WARNING: index {index.name} not created: {e.orig}")
@@ -7,6 +7,7 @@ function ChatInterface() {
   const [messages, setMessages] = useState([]);
   const [input, setInput] = useState('');
   const [isLoading, setIsLoading] = useState(false);
+  const [streamingMessageId, setStreamingMessageId] = useState(null);
   const [isSidebarCollapsed, setIsSidebarCollapsed] = useState(false);
   const [searchQuery, setSearchQuery] = useState('');
   const [copiedMessageId, setCopiedMessageId] = useState(null);
@@ -121,6 +122,28 @@ function ChatInterface() {
     }
   };
 
+  // La réponse s'affiche au fil des tokens : le message est créé à l'arrivée des sources
+  const streamAnswer = (question, messageId) =>
+    chatAPI.askQuestionStream(question, {
+      onSources: ({ ranked_documents }) => {
+        setStreamingMessageId(messageId);
+        setMessages((prev) => [
+          ...prev,
+          { id: messageId, type: 'ai', content: '', sources: ranked_documents || [] },
+        ]);
+      },
+      onToken: (text) => {
+        setMessages((prev) =>
+          prev.map((msg) => (msg.id === messageId ? { ...msg, content: msg.content + text } : msg))
+        );
+      },
+      onDone: ({ answer }) => {
+        setMessages((prev) =>
+          prev.map((msg) => (msg.id === messageId ? { ...msg, content: answer } : msg))
+        );
+      },
+    });
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     if (!input.trim() || isLoading) return;
@@ -136,23 +159,17 @@ function ChatInterface() {
     setIsLoading(true);
 
     try {
-      const response = await chatAPI.askQuestion(input.trim());
-      const aiMessage = {
-        id: Date.now() + 1,
-        type: 'ai',
-        content: response.data.response.answer || response.data.response,
-        sources: response.data.response.ranked_documents || [],
-      };
-      setMessages((prev) => [...prev, aiMessage]);
+      await streamAnswer(input.trim(), Date.now() + 1);
     } catch (error) {
       const errorMessage = {
         id: Date.now() + 1,
         type: 'error',
-        content: error.response?.data?.error || 'Une erreur est survenue. Assurez-vous d\'avoir uploadé des documents.',
+        content: error.message || 'Une erreur est survenue. Assurez-vous d\'avoir uploadé des documents.',
       };
       setMessages((prev) => [...prev, errorMessage]);
     } finally {
       setIsLoading(false);
+      setStreamingMessageId(null);
     }
   };
 
@@ -183,23 +200,17 @@ function ChatInterface() {
     setIsLoading(true);
 
     try {
-      const response = await chatAPI.askQuestion(lastUserMessage.content);
-      const aiMessage = {
-        id: Date.now(),
-        type: 'ai',
-        content: response.data.response.answer || response.data.response,
-        sources: response.data.response.ranked_documents || [],
-      };
-      setMessages((prev) => [...prev, aiMessage]);
+      await streamAnswer(lastUserMessage.content, Date.now());
     } catch (error) {
       const errorMessage = {
         id: Date.now(),
         type: 'error',
-        content: error.response?.data?.error || 'Une erreur est survenue.',
+        content: error.message || 'Une erreur est survenue.',
       };
       setMessages((prev) => [...prev, errorMessage]);
     } finally {
       setIsLoading(false);
+      setStreamingMessageId(null);
     }
   };
 
@@ -470,7 +481,7 @@ function ChatInterface() {
             ))
           )}
 
-          {isLoading && (
+          {isLoading && !streamingMessageId && (
             <div className="flex gap-4 justify-start">
               <div className="flex-shrink-0 w-10 h-10 bg-gradient-to-br from-purple-400 to-pink-600 rounded-xl flex items-center justify-center shadow-lg">
                 <Bot className="w-6 h-6 text-white" />
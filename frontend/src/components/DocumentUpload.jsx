@@ -3,6 +3,9 @@ import { useDropzone } from 'react-dropzone';
 import { Upload, FileText, X, CheckCircle, AlertCircle } from 'lucide-react';
 import { documentsAPI } from '../services/api';
 
+// Durée maximale de suivi d'un job d'ingestion (30 minutes)
+const JOB_TIMEOUT_MS = 30 * 60 * 1000;
+
 function DocumentUpload({ onUploadSuccess }) {
   const [files, setFiles] = useState([]);
   const [uploading, setUploading] = useState(false);
@@ -31,6 +34,20 @@ function DocumentUpload({ onUploadSuccess }) {
     setFiles((prev) => prev.filter((f) => f.id !== id));
   };
 
+  // Les fichiers sont traités en arrière-plan : on interroge le job jusqu'à la fin
+  const waitForJob = async (jobId) => {
+    // Abandonner le suivi si le traitement n'aboutit pas (serveur redémarré, worker bloqué)
+    const deadline = Date.now() + JOB_TIMEOUT_MS;
+    while (Date.now() < deadline) {
+      const { data } = await documentsAPI.getIngestionJob(jobId);
+      if (data.status === 'done' || data.status === 'failed') {
+        return data;
+      }
+      await new Promise((resolve) => setTimeout(resolve, 2000));
+    }
+    throw new Error('Le traitement du document a dépassé le délai d\'attente');
+  };
+
   const handleUpload = async () => {
     if (files.length === 0) return;
 
@@ -44,6 +61,11 @@ function DocumentUpload({ onUploadSuccess }) {
       });
 
       const response = await documentsAPI.uploadDocument(formData);
+      const job = await waitForJob(response.data.job.job_id);
+
+      if (job.files.some((f) => f.status === 'failed')) {
+        throw new Error(job.files.map((f) => f.error).filter(Boolean).join('\n'));
+      }
 
       setUploadStatus('success');
       setFiles([]);
@@ -57,7 +79,7 @@ function DocumentUpload({ onUploadSuccess }) {
         setUploadStatus(null);
       }, 3000);
 
-      console.log('Upload success:', response.data);
+      console.log('Upload success:', job);
     } catch (error) {
       setUploadStatus('error');
       console.error('Upload error:', error);
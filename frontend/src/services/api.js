@@ -54,6 +54,7 @@ export const documentsAPI = {
         'Content-Type': 'multipart/form-data',
       },
     }),
+  getIngestionJob: (jobId) => api.get(`/process-document/${jobId}`),
   getDocument: (documentId) => api.get(`/document/${documentId}`),
   getDocumentFile: (documentId) => api.get(`/document_file/${documentId}`, {
     responseType: 'blob',
@@ -66,6 +67,53 @@ export const documentsAPI = {
 // RAG/Chat API
 export const chatAPI = {
   askQuestion: (query) => api.post('/ask', { query }),
+  // Réponse en streaming (Server-Sent Events) : sources, puis tokens, puis done
+  askQuestionStream: async (query, { onSources, onToken, onDone } = {}) => {
+    const token = localStorage.getItem('access_token');
+    const response = await fetch(`${API_URL}/ask/stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        ...(token ? { Authorization: `Bearer ${token}` } : {}),
+      },
+      credentials: 'include',
+      body: JSON.stringify({ query }),
+    });
+
+    if (response.status === 401) {
+      localStorage.removeItem('access_token');
+      localStorage.removeItem('user_email');
+      window.location.href = '/login';
+      return;
+    }
+    if (!response.ok) {
+      const body = await response.json().catch(() => ({}));
+      throw new Error(body.error || `HTTP ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // Les événements sont séparés par une ligne vide
+      let separator;
+      while ((separator = buffer.indexOf('\n\n')) !== -1) {
+        const raw = buffer.slice(0, separator);
+        buffer = buffer.slice(separator + 2);
+        const event = raw.match(/^event: (.*)$/m)?.[1];
+        const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] || '{}');
+
+        if (event === 'sources') onSources?.(data);
+        else if (event === 'token') onToken?.(data.text);
+        else if (event === 'done') onDone?.(data);
+        else if (event === 'error') throw new Error(data.error);
+      }
+    }
+  },
   getChatHistory: () => api.get('/chat/history'),
   deleteChatHistory: (historyId) => api.delete(`/chat/history/${historyId}`),
   clearChatHistory: () => api.delete('/chat/history'),
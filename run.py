@@ -1,6 +1,8 @@
 from app import create_app
 
-app = create_app()
+# Spawned worker processes (PDF extraction pool) import this module as __mp_main__
+if __name__ != "__mp_main__":
+    app = create_app()
 
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file